@@ -5,38 +5,53 @@
 $(function() {
     const newGrid = (_selector) => {
         const selector = $(_selector);
-        const _cache = [];
+        let _cache = [];
+        let _width = 0;
+        let _height = 0;
 
-        for (let y = 0; y < 16; y++) {
-            for (let x = 0; x < 16; x++) {
-                const div = $('<div/>', { id: `${x}_${y}` }).addClass('led');
-                const inner = $('<div/>', { class: 'led-inner' });
-                div.append(inner);
+        const resize = (width, height) => {
+            if (width === _width && height === _height) {
+                return;
+            }
+            _width = width;
+            _height = height;
+            _cache = [];
+
+            selector.empty();
+            selector.css({ 'grid-template-columns': `repeat(${width},1fr)` });
+
+            for (let y = 0; y < height; y++) {
+                for (let x = 0; x < width; x++) {
+                    const div = $('<div/>', { id: `${x}_${y}` }).addClass('led');
+                    const inner = $('<div/>', { class: 'led-inner' });
+                    div.append(inner);
 
-                $(selector).append(div);
-                _cache.push($(inner));
+                    selector.append(div);
+                    _cache.push($(inner));
+                }
             }
-        }
+        };
+
+        resize(16, 16);
 
         return {
-            draw: (pixmap) => {
-                for (let y = 0; y < 16; y++) {
-                    for (let x = 0; x < 16; x++) {
-                        const [r, g, b] = pixmap[y * 16 + x];
-                        //_cache[y * 16 + x].css({ 'background-color': `rgb(${r},${g},${b})` });
-                        _cache[y * 16 + x].css({
-                            background: `-webkit-radial-gradient(rgba(${r},${g},${b},1) 0%, rgba(255,255,255,0) 100%)`
-                        });
-                    }
+            draw: (pixmap, width, height) => {
+                resize(width, height);
+                for (let i = 0; i < pixmap.length; i++) {
+                    const [r, g, b] = pixmap[i];
+                    //_cache[i].css({ 'background-color': `rgb(${r},${g},${b})` });
+                    _cache[i].css({
+                        background: `-webkit-radial-gradient(rgba(${r},${g},${b},1) 0%, rgba(255,255,255,0) 100%)`
+                    });
                 }
             },
             delta: (delta) => {
                 //console.log('Delta pixels = ',delta.length)
                 for (let i = 0; i < delta.length; i++) {
                     const [x, y, [r, g, b]] = delta[i];
-                    //_cache[y * 16 + x].css({ 'background-color': `rgb(${r},${g},${b})` });
+                    //_cache[y * _width + x].css({ 'background-color': `rgb(${r},${g},${b})` });
 
-                    _cache[y * 16 + x].css({
+                    _cache[y * _width + x].css({
                         background: `-webkit-radial-gradient(rgba(${r},${g},${b},1) 0%, rgba(255,255,255,0) 100%)`
                     });
 
@@ -73,7 +88,7 @@ $(function() {
         const data = JSON.parse(event.data);
         if (data.type === 'pixmap') {
             //console.log('Got pixmap bytes =', event.data.length);
-            grid.draw(data.pixmap);
+            grid.draw(data.pixmap, data.width, data.height);
         }
         if (data.type === 'delta') {
             //console.log('Got delta bytes =', event.data.length);
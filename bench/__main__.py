@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+import sys
+import logging
+import argparse
+
+from bench.cases import all_benchmarks
+from bench.runner import run_all, report, load, save
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Offline benchmarks for render, encode and transport paths')
+
+    parser.add_argument('-r', '--rounds', type=int, default=200, dest='rounds', help='timed rounds per benchmark')
+    parser.add_argument('-c', '--clients', type=int, default=10, dest='clients', help='number of fake websocket clients')
+    parser.add_argument('-k', '--match', default='', dest='match', help='only run benchmarks containing this string')
+    parser.add_argument('-s', '--save', default='', dest='save', help='save results as json')
+    parser.add_argument('-b', '--baseline', default='', dest='baseline', help='compare against saved json results')
+    parser.add_argument('-t', '--threshold', type=float, default=1.25, dest='threshold', help='p50 ratio counted as a regression')
+
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+
+    results = run_all(all_benchmarks(args.clients), args.rounds, args.match)
+    baseline = load(args.baseline) if args.baseline else None
+
+    regressions = report(results, baseline, args.threshold)
+
+    if args.save:
+        save(args.save, results)
+
+    if regressions:
+        print('{} benchmark(s) slower than baseline'.format(regressions))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
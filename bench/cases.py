@@ -0,0 +1,190 @@
+import atexit
+import asyncio
+import itertools
+from types import SimpleNamespace
+from typing import List
+
+from pixmap.histpixmap import HistPixmap, ModeType
+from pixmap.histogram import Histogram
+from pixmap import transitions
+from evo.encoder import EvoEncoder
+from evo.framecache import FrameCache
+from evo.simulator import Simulator
+from evo.timebox import AsyncTimebox
+
+from bench import fixtures
+from bench.runner import Benchmark, Group
+
+DRAW_MODES = list(ModeType)
+
+
+def render_benchmarks() -> Group:
+    group = Group(lambda: fixtures.histpixmap()[0])
+    for mode in DRAW_MODES:
+        group.add('render.draw_mode.{}'.format(mode.name), lambda pixmap, mode=mode: pixmap.draw_mode(mode))
+        group.add('render.draw_mode.{}.cold'.format(mode.name), lambda pixmap, mode=mode: pixmap.draw_mode(mode),
+                  lambda pixmap: pixmap.invalidate())
+    group.add('render.add_temp', lambda pixmap: pixmap.add_temp(3.2, 1570168800))
+    group.add('render.pixel_list', lambda pixmap: pixmap.pixel_list())
+    group.add('render.draw_temp', lambda pixmap: pixmap.draw_temp(-12.5))
+    group.add('render.draw_clock', lambda pixmap: pixmap.draw_clock(1570183200))
+    return group
+
+
+def histogram_benchmarks(size: int) -> Group:
+    """One sample added and the points drawn from it"""
+    group = Group(lambda: (Histogram(size, 5), itertools.cycle(fixtures.temperature_series(size * 2))))
+
+    def step(fixture):
+        histogram, samples = fixture
+        histogram.add(*next(samples))
+        histogram.points()
+
+    group.add('histogram.add_points[{}]'.format(size), step)
+    return group
+
+
+def decode_benchmarks() -> Group:
+    paths = fixtures.background_paths()
+    group = Group(lambda: SimpleNamespace(pixmap=fixtures.histpixmap(0)[0], images=dict(fixtures.background_images())))
+
+    def decode_all(fixture):
+        for img in fixture.images.values():
+            fixture.pixmap.decode_image(img)
+
+    group.add('decode.backgrounds[{}]'.format(len(paths)), decode_all)
+    for path in paths[:2]:
+        group.add('decode.{}'.format(path), lambda fixture, path=path: fixture.pixmap.decode_image(fixture.images[path]))
+    return group
+
+
+def encode_benchmarks() -> Group:
+    modes = (ModeType.hist, ModeType.sunrise)
+
+    def build():
+        pixmap, _ = fixtures.histpixmap()
+        frames = {}
+        for mode in modes:
+            pixmap.draw_mode(mode)
+            frames[mode] = SimpleNamespace(colours=pixmap.get_pixel_data(), rgb=pixmap.get_packed_data(), cache=FrameCache(8))
+        return frames
+
+    group = Group(build)
+    for mode in modes:
+        group.add('encode.image_bytes.{}'.format(mode.name), lambda frames, mode=mode: EvoEncoder.image_bytes(frames[mode].colours))
+        group.add('encode.frame_cache.{}'.format(mode.name), lambda frames, mode=mode: frames[mode].cache.image_bytes(frames[mode].rgb))
+    return group
+
+
+def transport_benchmarks(clients: int) -> Group:
+    group = Group(lambda: SimpleNamespace(server=fixtures.load_server(), pixmap=fixtures.histpixmap()[0],
+                                          fakes=[fixtures.FakeClient() for _ in range(clients)]))
+
+    def redraw(pixmap: HistPixmap, mode: ModeType):
+        pixmap.draw_mode(ModeType.hist)
+        pixmap.commit()
+        pixmap.draw_mode(mode)
+
+    def delta_to_json(fixture):
+        fixture.server.Divoom.delta_to_json(fixture.pixmap.commit())
+
+    def fan_out(fixture):
+        ws = fixture.server.WsHandler
+        saved = ws.clients
+        ws.clients = fixture.fakes
+        try:
+            ws.broadcast(fixture.server.Divoom.delta_to_json(fixture.pixmap.commit()))
+        finally:
+            ws.clients = saved
+
+    group.add('transport.delta_to_json.digit', delta_to_json,
+              lambda fixture: (redraw(fixture.pixmap, ModeType.hist), fixture.pixmap.draw_temp(-4.2)))
+    group.add('transport.delta_to_json.full', delta_to_json, lambda fixture: redraw(fixture.pixmap, ModeType.sunset))
+    group.add('transport.ws_delta[{}]'.format(clients), fan_out, lambda fixture: redraw(fixture.pixmap, ModeType.sunset))
+    return group
+
+
+def fade_benchmarks() -> Group:
+
+    def build():
+        pixmap, _ = fixtures.histpixmap()
+        pixmap.draw_mode(ModeType.sunrise)
+        before = pixmap.get_packed_data()
+        pixmap.draw_forecast_symbol('max')
+        return SimpleNamespace(pixmap=pixmap, before=before, after=pixmap.get_packed_data())
+
+    group = Group(build)
+    group.add('render.forecast_fade', lambda fixture: fixture.pixmap.draw_forecast('max'))
+    for name, transition in sorted(transitions.TRANSITIONS.items()):
+        group.add('render.transition.{}'.format(name),
+                  lambda fixture, transition=transition: transition(fixture.before, fixture.after, 16, 16, 8))
+    return group
+
+
+def size_benchmarks(size: int) -> Group:
+    """Full redraws, diffs and encodes on a larger display"""
+
+    def build():
+        pixmap, _ = fixtures.histpixmap(size=size)
+        pixmap.draw_mode(ModeType.sunrise)
+        return SimpleNamespace(pixmap=pixmap, rgb=pixmap.get_packed_data())
+
+    def redraw(pixmap: HistPixmap, mode: ModeType):
+        pixmap.invalidate()
+        pixmap.draw_mode(mode)
+
+    def full_diff(fixture):
+        redraw(fixture.pixmap, ModeType.hist)
+        fixture.pixmap.commit()
+        redraw(fixture.pixmap, ModeType.sunset)
+
+    prefix = 'size{}'.format(size)
+    group = Group(build)
+    group.add('{}.draw_mode.hist'.format(prefix), lambda fixture: redraw(fixture.pixmap, ModeType.hist))
+    group.add('{}.draw_mode.sunrise'.format(prefix), lambda fixture: redraw(fixture.pixmap, ModeType.sunrise))
+    group.add('{}.commit.full'.format(prefix), lambda fixture: fixture.pixmap.commit(), full_diff)
+    group.add('{}.encode.image_bytes'.format(prefix),
+              lambda fixture: EvoEncoder.image_bytes(EvoEncoder.rgb_to_colours(fixture.rgb), size, size))
+    return group
+
+
+def simulator_benchmarks() -> Group:
+    """Round trips to the device simulator over a local TCP socket"""
+
+    def build():
+        loop = asyncio.new_event_loop()
+        simulator = Simulator()
+        server = loop.run_until_complete(simulator.start('tcp://127.0.0.1:0'))
+        port = server.sockets[0].getsockname()[1]
+
+        timebox = AsyncTimebox('tcp://127.0.0.1:{}'.format(port), loop, timeout=1.0)
+        timebox.connect()
+
+        def close():
+            timebox.disconnect()
+            simulator.close()
+            loop.run_until_complete(asyncio.sleep(0.05))
+            loop.close()
+
+        atexit.register(close)
+
+        pixmap, _ = fixtures.histpixmap()
+        pixmap.draw_mode(ModeType.sunrise)
+        frames = [([(r << 16) + (g << 8) + b for (r, g, b) in pixels], delay) for pixels, delay in pixmap.draw_forecast('max')]
+        return SimpleNamespace(loop=loop, timebox=timebox, image=[EvoEncoder.image_bytes(pixmap.get_pixel_data())],
+                               animation=EvoEncoder.animation_bytes(frames))
+
+    def send(fixture, packets: List[bytes]):
+        for packet in packets:
+            fixture.loop.run_until_complete(fixture.timebox.send(packet))
+
+    group = Group(build)
+    group.add('transport.simulator.image', lambda fixture: send(fixture, fixture.image))
+    group.add('transport.simulator.animation', lambda fixture: send(fixture, fixture.animation))
+    return group
+
+
+def all_benchmarks(clients: int = 10) -> List[Benchmark]:
+    groups = [render_benchmarks(), histogram_benchmarks(14), histogram_benchmarks(1024), fade_benchmarks(), decode_benchmarks(),
+              encode_benchmarks(), transport_benchmarks(clients), size_benchmarks(64), simulator_benchmarks()]
+    return [bench for group in groups for bench in group.benchmarks]
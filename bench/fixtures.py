@@ -0,0 +1,83 @@
+import glob
+import math
+import random
+import importlib.util
+from typing import Any, Callable, List, Tuple
+
+from PIL import Image
+
+from pixmap.histpixmap import HistPixmap
+from pixmap.atlas import SpriteAtlas
+
+
+class FakeDivoom():
+    """Stands in for Divoom, counts sends instead of talking to a device"""
+
+    def __init__(self):
+        self.sent = 0
+
+    def send(self):
+        self.sent += 1
+
+    def send_animation(self, frames: List, hold: bool = False):
+        self.sent += 1
+
+    def after_delay(self, delay: int, fn: Callable):
+        pass
+
+    def cancel_delay(self, handle: Any):
+        pass
+
+
+class FakeClient():
+    """Stands in for a connected WsHandler"""
+
+    def __init__(self):
+        self.written = 0
+
+    def write_message(self, message: str):
+        self.written += len(message)
+
+
+def load_server():
+    spec = importlib.util.spec_from_file_location('tb_evo_rest', 'tb-evo-rest.py')
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def temperature_series(count: int, seed: int = 4711) -> List[Tuple[float, int]]:
+    rnd = random.Random(seed)
+    epoch = 1570168800
+    result = []
+    for i in range(count):
+        val = 8.0 * math.sin(i / 30.0) + rnd.uniform(-0.3, 0.3)
+        result.append((round(val, 1), epoch + i * 60))
+    return result
+
+
+def histpixmap(samples: int = 60, size: int = 16) -> Tuple[HistPixmap, FakeDivoom]:
+    divoom = FakeDivoom()
+    atlas = SpriteAtlas('backgrounds', size, size)
+    atlas.load()
+    pixmap = HistPixmap(size, size, divoom, atlas=atlas)
+    for val, epoch in temperature_series(samples):
+        pixmap.add_temp(val, epoch)
+    pixmap.set_sunrise(1570168800)
+    pixmap.set_sunset(1570208400)
+    pixmap.set_forecast({'min': {'symbol': '03d', 'temp': -2, 'timestamp': 1570168800},
+                         'max': {'symbol': '01d', 'temp': 12, 'timestamp': 1570183200}})
+    return pixmap, divoom
+
+
+def background_paths() -> List[str]:
+    return sorted(glob.glob('backgrounds/*.png') + glob.glob('backgrounds/yr/*.png'))
+
+
+def background_images() -> List[Tuple[str, Image.Image]]:
+    result = []
+    for path in background_paths():
+        img = Image.open(path)
+        img.load()
+        result.append((path, img))
+    return result
@@ -0,0 +1,153 @@
+import gc
+import json
+import time
+import logging
+import tracemalloc
+from functools import partial
+from typing import Any, Callable, Dict, List, Optional
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class Benchmark():
+    """fn is timed, setup runs untimed before every round
+
+    In a group, fn and setup take the fixture of the group.
+    """
+
+    def __init__(self, name: str, fn: Callable[..., Any], setup: Callable[..., Any] = None, group: 'Group' = None):
+        self.name = name
+        self._fn = fn
+        self._setup = setup
+        self._group = group
+
+    def _bind(self):
+        if self._group is None:
+            return
+        fixture = self._group.fixture()
+        self._fn = partial(self._fn, fixture)
+        if self._setup:
+            self._setup = partial(self._setup, fixture)
+        self._group = None
+
+    def timings(self, rounds: int) -> List[float]:
+        result = []
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            for _ in range(rounds):
+                if self._setup:
+                    self._setup()
+                start = time.perf_counter()
+                self._fn()
+                result.append((time.perf_counter() - start) * 1e6)
+        finally:
+            if gc_enabled:
+                gc.enable()
+        return result
+
+    def allocations(self, rounds: int) -> Dict[str, float]:
+        peaks = []
+        blocks = []
+        tracemalloc.start()
+        try:
+            for _ in range(rounds):
+                if self._setup:
+                    self._setup()
+                before = tracemalloc.take_snapshot()
+                tracemalloc.reset_peak()
+                base, _ = tracemalloc.get_traced_memory()
+                self._fn()
+                _, peak = tracemalloc.get_traced_memory()
+                after = tracemalloc.take_snapshot()
+                peaks.append(peak - base)
+                blocks.append(sum(max(0, s.count_diff) for s in after.compare_to(before, 'filename')))
+        finally:
+            tracemalloc.stop()
+        return {'peak_bytes': max(peaks), 'retained_blocks': max(blocks)}
+
+    def run(self, rounds: int, warmup: int = 5) -> Dict[str, Any]:
+        self._bind()
+        self.timings(warmup)
+        samples = self.timings(rounds)
+        result = {
+            'rounds': rounds,
+            'mean_us': sum(samples) / len(samples),
+            'p50_us': percentile(samples, 50),
+            'p90_us': percentile(samples, 90),
+            'p99_us': percentile(samples, 99),
+            'max_us': max(samples),
+        }  # type: Dict[str, Any]
+        result.update(self.allocations(min(rounds, 20)))
+        return result
+
+
+class Group():
+    """Benchmarks sharing a fixture, built by factory once the first of them runs
+
+    Filtered runs only pay for the fixtures of the benchmarks they select.
+    """
+
+    def __init__(self, factory: Callable[[], Any]):
+        self._factory = factory
+        self._fixture = None  # type: Optional[Any]
+        self._built = False
+        self.benchmarks = []  # type: List[Benchmark]
+
+    def add(self, name: str, fn: Callable[..., Any], setup: Callable[..., Any] = None):
+        self.benchmarks.append(Benchmark(name, fn, setup, self))
+
+    def fixture(self) -> Any:
+        if not self._built:
+            self._fixture = self._factory()
+            self._built = True
+        return self._fixture
+
+
+def run_all(benchmarks: List[Benchmark], rounds: int, match: str = '') -> Dict[str, Dict[str, Any]]:
+    results = {}
+    for bench in benchmarks:
+        if match and match not in bench.name:
+            continue
+        logging.info('Running %s', bench.name)
+        results[bench.name] = bench.run(rounds)
+    return results
+
+
+def report(results: Dict[str, Dict[str, Any]], baseline: Dict[str, Dict[str, Any]] = None, threshold: float = 1.25) -> int:
+    regressions = 0
+    width = max([len(name) for name in results] + [10])
+
+    header = '{:<{w}} {:>10} {:>10} {:>10} {:>10} {:>12}'.format('benchmark', 'p50 us', 'p90 us', 'p99 us', 'max us', 'peak bytes', w=width)
+    if baseline:
+        header += ' {:>9}'.format('vs base')
+    print(header)
+
+    for name, res in results.items():
+        line = '{:<{w}} {:>10.1f} {:>10.1f} {:>10.1f} {:>10.1f} {:>12}'.format(
+            name, res['p50_us'], res['p90_us'], res['p99_us'], res['max_us'], res['peak_bytes'], w=width)
+        if baseline and name in baseline:
+            ratio = res['p50_us'] / max(baseline[name]['p50_us'], 1e-9)
+            flag = ''
+            if ratio > threshold:
+                flag = ' !'
+                regressions += 1
+            line += ' {:>8.2f}x{}'.format(ratio, flag)
+        print(line)
+
+    return regressions
+
+
+def load(path: str) -> Dict[str, Dict[str, Any]]:
+    with open(path) as fh:
+        return json.load(fh)['results']
+
+
+def save(path: str, results: Dict[str, Dict[str, Any]]):
+    with open(path, 'w') as fh:
+        json.dump({'created': int(time.time()), 'results': results}, fh, indent=2, sort_keys=True)
+        fh.write('\n')
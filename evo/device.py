@@ -0,0 +1,51 @@
+import asyncio
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from evo.timebox import AsyncTimebox
+from evo.ratelimit import RateLimiter
+from evo.supervisor import LinkSupervisor
+from evo.framequeue import FrameQueue
+
+
+class Device():
+    """One display with its own transport, link supervisor and frame queue"""
+
+    def __init__(self, address: str, loop: asyncio.AbstractEventLoop, handshake: Callable[[], List[bytes]],
+                 keepalive: float = 300.0, mode: Optional[str] = None, window: int = 4,
+                 max_rate: float = 0.0, max_missed: int = 3):
+        self.address = address
+        self.mode = mode
+        limiter = RateLimiter(min(RateLimiter.DEFAULT_RATE, max_rate), max_rate=max_rate) if max_rate > 0 else None
+        self.timebox = AsyncTimebox(address, loop, True, window=window, limiter=limiter)
+        self.link = LinkSupervisor(self.timebox, loop, handshake, max_missed)
+        self.queue = FrameQueue(self.link, loop, keepalive)
+        self.link.add_listener(self.queue.resend_current)
+
+    @classmethod
+    def parse(cls, spec: str) -> Tuple[str, Optional[str]]:
+        """'AA:BB:CC:DD:EE:FF' or 'AA:BB:CC:DD:EE:FF@clock' for a device with its own mode"""
+        address, _, mode = spec.strip().partition('@')
+        return address, mode or None
+
+    def start(self):
+        self.link.start()
+
+    def put_command(self, data: bytes):
+        self.queue.put_command(data)
+
+    def put_frame(self, packets: List[bytes]):
+        self.queue.put_frame(packets)
+
+    def rate(self) -> Optional[float]:
+        return self.timebox.rate()
+
+    def shutdown(self, commands: List[bytes]):
+        self.queue.close()
+        if self.timebox.connected():
+            for command in commands:
+                self.timebox.send_blocking(command)
+        self.timebox.disconnect()
+
+    def stats(self) -> Dict[str, Any]:
+        return {'mode': self.mode, 'link': self.link.stats(), 'transport': self.timebox.stats(),
+                'frame_queue': self.queue.stats()}
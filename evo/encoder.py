@@ -1,39 +1,91 @@
 import math
+import logging
 import binascii
 import struct
-from typing import List
-from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+
+AnimationFrame = Tuple[List[int], int]
+RGBColor = Tuple[int, int, int]
 
 
 class EvoEncoder():
+
+    CHUNK_SIZE = 200
+    # Animation data is uploaded with a 16 bit length in at most 256 chunks
+    MAX_ANIMATION = min(0xFFFF, 256 * CHUNK_SIZE)
+
+    # Still image command up to the palette, by display width and height. Displays without an entry
+    # get the generic header, with the image record carrying its real length
+    IMAGE_HEADERS = {
+        (16, 16): b'\x44\x00\x0A\x0A\x04\xAA\x2D\x00\x00\x00\x00',
+    }  # type: Dict[Tuple[int, int], bytes]
+
     def __init__(self):
         pass
 
+    @staticmethod
+    def rgb_to_colours(rgb: bytes) -> List[int]:
+        """Packed RGB bytes to a list of 24 bit colours"""
+        count = len(rgb) // 3
+        words = bytearray(4 * count)
+        words[1::4] = rgb[0::3]
+        words[2::4] = rgb[1::3]
+        words[3::4] = rgb[2::3]
+        return list(struct.unpack('>%dI' % count, words))
+
+    @staticmethod
+    def build_palette(colour_array: List[int]) -> Tuple[List[int], List[int]]:
+        palette = {}  # type: Dict[int, int]
+        indexes = [palette.setdefault(colour, len(palette)) for colour in colour_array]
+        return list(palette), indexes
+
+    @staticmethod
+    def bits_needed(colours: int) -> int:
+        return max(1, int(math.ceil(math.log(colours, 2))))
+
+    @staticmethod
+    def pack_indexes(indexes: List[int], bits: int) -> bytes:
+        """Pack palette indexes, least significant bit first"""
+        if np is not None and len(indexes) >= 1024:
+            idx = np.asarray(indexes, dtype=np.uint16)
+            stream = (idx[:, None] >> np.arange(bits, dtype=np.uint16)) & 1
+            return np.packbits(stream.astype(np.uint8).ravel(), bitorder='little').tobytes()
+
+        acc = 0
+        shift = 0
+        for index in indexes:
+            acc |= index << shift
+            shift += bits
+        return acc.to_bytes((shift + 7) // 8, 'little')
+
+    @staticmethod
+    def pack_palette(palette: List[int]) -> bytes:
+        """Palette as packed 24 bit big endian colours"""
+        words = memoryview(struct.pack('>%dI' % len(palette), *palette))
+        result = bytearray(3 * len(palette))
+        result[0::3] = words[1::4]
+        result[1::3] = words[2::4]
+        result[2::3] = words[3::4]
+        return bytes(result)
+
+    @staticmethod
+    def pack_colours(colour_array: List[int]) -> bytes:
+        palette, indexes = EvoEncoder.build_palette(colour_array)
+        if len(palette) > 256:
+            raise ValueError('Frame has {} colours, at most 256 can be encoded'.format(len(palette)))
+        bits = EvoEncoder.bits_needed(len(palette))
+
+        return bytes((len(palette) % 256,)) + EvoEncoder.pack_palette(palette) + EvoEncoder.pack_indexes(indexes, bits)
+
     @staticmethod
     def encode_colours(colour_array: List[int]) -> str:
-        colour_dict = OrderedDict()  # type: OrderedDict[int,int]
-        colour_order = []
-        for colour in colour_array:
-            if colour not in colour_dict:
-                colour_dict[colour] = len(colour_dict)
-            colour_order.append(colour_dict[colour])
-
-        bits_needed = int(math.ceil(math.log(len(colour_dict), 2)))
-        if bits_needed == 0:
-            bits_needed = 1
-        img_data = '{0:02x}'.format(len(colour_dict) % 256)
-        for colour in colour_dict:
-            img_data += '{0:06x}'.format(colour)
-
-        c_data = ''
-        for i in colour_order:
-            c_data += '{0:08b}'.format(i)[-1::-1][:bits_needed]
-        for i in range(-1, len(c_data) - 1, 8):
-            if i == -1:
-                img_data += '{0:02x}'.format(int(c_data[i + 8::-1], 2))
-                continue
-            img_data += '{0:02x}'.format(int(c_data[i + 8:i:-1], 2))
-        return img_data
+        return EvoEncoder.pack_colours(colour_array).hex()
 
     @staticmethod
     def crc(pl: bytes) -> bytes:
@@ -47,11 +99,50 @@ class EvoEncoder():
         return struct.pack('<H', 2 + len(pl))
 
     @staticmethod
-    def image_bytes(colour_array: List[int]) -> bytes:
-        hex_data = '44000A0A04AA2D00000000' + EvoEncoder.encode_colours(colour_array)
-        payload = binascii.unhexlify(hex_data)
-        payload = EvoEncoder.length(payload) + payload
-        return b'\x01' + payload + EvoEncoder.crc(payload) + b'\x02'
+    def image_bytes(colour_array: List[int], width: int = 16, height: int = 16) -> bytes:
+        if len(colour_array) != width * height:
+            raise ValueError('{} colours do not fill a {}x{} display'.format(len(colour_array), width, height))
+        colours = EvoEncoder.pack_colours(colour_array)
+        header = EvoEncoder.IMAGE_HEADERS.get((width, height))
+        if header is None:
+            header = b'\x44\x00\x0A\x0A\x04\xAA' + struct.pack('<HHB', 6 + len(colours), 0, 0)
+        return EvoEncoder.encode_bytes(header + colours)
+
+    @staticmethod
+    def animation_frame(colour_array: List[int], delay: int) -> bytes:
+        """A single frame, delay is in milliseconds"""
+        colours = EvoEncoder.pack_colours(colour_array)
+        return b'\xAA' + struct.pack('<HHB', 6 + len(colours), delay, 0) + colours
+
+    @staticmethod
+    def animation_bytes(frames: List[AnimationFrame]) -> List[bytes]:
+        """Encode frames as a device side animation, split into upload packets
+
+        Animations larger than the device takes are thinned to fewer frames
+        that play for the same time.
+        """
+        data = b''.join(EvoEncoder.animation_frame(*frame) for frame in frames)
+        thinned = frames
+        while len(data) > EvoEncoder.MAX_ANIMATION:
+            if len(thinned) == 1:
+                raise ValueError('Animation frame of {} bytes is too large'.format(len(data)))
+            count = min(len(thinned) - 1, len(thinned) * EvoEncoder.MAX_ANIMATION // len(data))
+            logging.info('Animation of %d bytes is too large, thinning from %d to %d frames', len(data), len(thinned), count)
+            thinned = EvoEncoder.thin_frames(frames, max(1, count))
+            data = b''.join(EvoEncoder.animation_frame(*frame) for frame in thinned)
+
+        chunks = range(0, len(data), EvoEncoder.CHUNK_SIZE)
+        return [EvoEncoder.encode_bytes(b'\x49' + struct.pack('<HB', len(data), i) + data[offset:offset + EvoEncoder.CHUNK_SIZE])
+                for i, offset in enumerate(chunks)]
+
+    @staticmethod
+    def thin_frames(frames: List[AnimationFrame], count: int) -> List[AnimationFrame]:
+        """Keep count evenly spaced frames, each shown as long as the frames it stands in for"""
+        if count >= len(frames):
+            return frames
+        bounds = [i * len(frames) // max(1, count) for i in range(max(1, count) + 1)]
+        return [(frames[start][0], min(0xFFFF, sum(delay for _, delay in frames[start:end])))
+                for start, end in zip(bounds, bounds[1:])]
 
     @staticmethod
     def encode_hex(hex_data: bytes) -> bytes:
@@ -63,3 +154,66 @@ class EvoEncoder():
     def encode_bytes(payload: bytes) -> bytes:
         payload = EvoEncoder.length(payload) + payload
         return b'\x01' + payload + EvoEncoder.crc(payload) + b'\x02'
+
+
+class EvoDecoder():
+    """Inverse of EvoEncoder"""
+
+    @staticmethod
+    def split_frames(buffer: bytearray) -> Tuple[List[bytes], bytearray]:
+        """Complete 0x01 ... crc 0x02 frames in buffer, and what is left over"""
+        frames = []
+        while True:
+            start = buffer.find(b'\x01')
+            if start < 0:
+                return frames, bytearray()
+            if len(buffer) < start + 3:
+                return frames, buffer[start:]
+            length = struct.unpack_from('<H', buffer, start + 1)[0]
+            end = start + length + 4
+            if len(buffer) < end:
+                return frames, buffer[start:]
+
+            payload = bytes(buffer[start + 1:start + 1 + length])
+            crc = bytes(buffer[start + 1 + length:end - 1])
+            if buffer[end - 1] == 0x02 and crc == EvoEncoder.crc(payload):
+                frames.append(payload[2:])
+                buffer = buffer[end:]
+            else:
+                logging.warning('Garbled frame, resyncing')
+                buffer = buffer[start + 1:]
+
+    @staticmethod
+    def reply_opcode(payload: bytes) -> Optional[int]:
+        """Command a device reply answers, replies look like 04 <command> 55 ..."""
+        if len(payload) >= 2 and payload[0] == 0x04:
+            return payload[1]
+        return None
+
+    @staticmethod
+    def unpack_indexes(data: bytes, bits: int, count: int) -> List[int]:
+        acc = int.from_bytes(data, 'little')
+        mask = (1 << bits) - 1
+        return [(acc >> (i * bits)) & mask for i in range(count)]
+
+    @staticmethod
+    def decode_image(frame: bytes, pixels: int) -> Tuple[List[RGBColor], int]:
+        """Decode an AA frame record, returns the pixels and the frame delay"""
+        if frame[0] != 0xAA:
+            raise ValueError('Not an image frame')
+        delay, colours = struct.unpack_from('<HxB', frame, 3)
+        colours = colours or 256
+        palette = [tuple(frame[7 + 3 * i:10 + 3 * i]) for i in range(colours)]
+        data = frame[7 + 3 * colours:]
+        indexes = EvoDecoder.unpack_indexes(data, EvoEncoder.bits_needed(colours), pixels)
+        return [palette[i] for i in indexes], delay  # type: ignore
+
+    @staticmethod
+    def split_animation(data: bytes) -> List[bytes]:
+        frames = []
+        offset = 0
+        while offset < len(data):
+            length = struct.unpack_from('<H', data, offset + 1)[0]
+            frames.append(data[offset:offset + length])
+            offset += length
+        return frames
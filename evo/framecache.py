@@ -0,0 +1,48 @@
+import hashlib
+from collections import OrderedDict
+from typing import Dict
+
+from evo.encoder import EvoEncoder
+
+
+class FrameCache():
+    """LRU cache of encoded device frames, keyed by the packed RGB pixel buffer"""
+
+    def __init__(self, size: int = 64, width: int = 16, height: int = 16):
+        self._size = size
+        self._width = width
+        self._height = height
+        self._frames = OrderedDict()  # type: OrderedDict[bytes, bytes]
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def digest(rgb: bytes) -> bytes:
+        return hashlib.blake2b(rgb, digest_size=16).digest()
+
+    def __len__(self) -> int:
+        return len(self._frames)
+
+    def clear(self):
+        self._frames.clear()
+
+    def image_bytes(self, rgb: bytes) -> bytes:
+        key = self.digest(rgb)
+
+        data = self._frames.get(key)
+        if data is not None:
+            self.hits += 1
+            self._frames.move_to_end(key)
+            return data
+
+        self.misses += 1
+        data = EvoEncoder.image_bytes(EvoEncoder.rgb_to_colours(rgb), self._width, self._height)
+
+        if self._size > 0:
+            self._frames[key] = data
+            if len(self._frames) > self._size:
+                self._frames.popitem(last=False)
+        return data
+
+    def stats(self) -> Dict[str, int]:
+        return {'size': len(self._frames), 'capacity': self._size, 'hits': self.hits, 'misses': self.misses}
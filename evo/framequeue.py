@@ -0,0 +1,162 @@
+import time
+import asyncio
+import hashlib
+import logging
+from collections import deque
+from concurrent.futures import Future
+from typing import Deque, Dict, List, Optional, Tuple, Union
+
+from evo.timebox import AsyncTimebox
+from evo.supervisor import LinkSupervisor
+from evo.pipeline import StageTimer
+
+Entry = Tuple[List[bytes], Optional[bytes], Optional[Future]]
+
+
+class FrameQueue():
+    """Outbound queue in front of AsyncTimebox
+
+    Commands are written in order and never dropped. Frames, a still image or
+    all packets of an animation, are latest wins: a frame that has not been
+    written yet is dropped as soon as a newer one is queued.
+
+    A frame identical to the last one the device acknowledged is suppressed,
+    unless keepalive seconds have passed since it was written. The last
+    frame is also written again every keepalive seconds when nothing new
+    was sent, so a display that dropped it does not stay blank.
+
+    The writer does not wait for acknowledgements, the next entry is handed
+    to the transport while the replies to the previous one are outstanding.
+    """
+
+    def __init__(self, timebox: Union[AsyncTimebox, LinkSupervisor], loop: asyncio.AbstractEventLoop, keepalive: float = 300.0):
+        self._timebox = timebox
+        self._loop = loop
+        self._keepalive = keepalive
+        self._queue = deque()  # type: Deque[Entry]
+        self._wakeup = asyncio.Event()
+        self._writing = False
+        self._inflight = 0
+        self._seq = 0
+        self._acked = None  # type: Optional[bytes]
+        self._acked_at = 0.0
+        self._current = None  # type: Optional[Tuple[List[bytes], bytes]]
+        self.sent = 0
+        self.dropped = 0
+        self.suppressed = 0
+        self.refreshed = 0
+        self.max_depth = 0
+        self.timer = StageTimer()
+        self._keepalive_handle = None  # type: Optional[asyncio.TimerHandle]
+        self._writer = asyncio.run_coroutine_threadsafe(self._write(), loop)
+        if keepalive > 0:
+            loop.call_soon_threadsafe(self._keepalive_tick)
+
+    def put_command(self, data: bytes):
+        self._loop.call_soon_threadsafe(self._put, [data], None, None)
+
+    def put_frame(self, packets: List[bytes]) -> Future:
+        """Queue a frame, the future is True once written and False if it was dropped or suppressed"""
+        done = Future()  # type: Future
+        digest = hashlib.blake2b(b''.join(packets), digest_size=16).digest()
+        self._loop.call_soon_threadsafe(self._put, packets, digest, done)
+        return done
+
+    def _put(self, packets: List[bytes], digest: Optional[bytes], done: Optional[Future]):
+        if digest:
+            for _, stale, stale_done in self._queue:
+                if stale:
+                    self.dropped += 1
+                    if stale_done:
+                        stale_done.set_result(False)
+            self._queue = deque(entry for entry in self._queue if not entry[1])
+
+            if digest == self._acked and not self._queue and not self._writing and not self._inflight:
+                if self._keepalive <= 0 or time.monotonic() - self._acked_at < self._keepalive:
+                    self.suppressed += 1
+                    if done:
+                        done.set_result(False)
+                    return
+                self.refreshed += 1
+
+        self._queue.append((packets, digest, done))
+        self.max_depth = max(self.max_depth, self.depth())
+        self._wakeup.set()
+
+    def resend_current(self):
+        """Queue the last frame again, unless a newer one is already waiting"""
+        self._loop.call_soon_threadsafe(self._resend_current)
+
+    def _resend_current(self):
+        self._acked = None
+        if self._current and not self._writing and not self._inflight and not any(entry[1] for entry in self._queue):
+            packets, digest = self._current
+            self._queue.append((packets, digest, None))
+            self._wakeup.set()
+
+    def _keepalive_tick(self):
+        """Resend the last frame once keepalive seconds passed since it was acknowledged, then check again"""
+        due = self._acked_at + self._keepalive - time.monotonic()
+        if due <= 0:
+            if self._current and not self._queue and not self._writing and not self._inflight:
+                self.refreshed += 1
+                self._resend_current()
+            due = self._keepalive
+        self._keepalive_handle = self._loop.call_later(due, self._keepalive_tick)
+
+    def depth(self) -> int:
+        return len(self._queue) + self._inflight + (1 if self._writing else 0)
+
+    async def _write(self):
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+
+            while self._queue:
+                await self._timebox.wait_connected()
+                if not self._queue:
+                    break
+                packets, digest, done = self._queue.popleft()
+                self._writing = True
+                self._seq += 1
+                self._acked = None
+                if digest:
+                    self._current = (packets, digest)
+                start = time.perf_counter()
+                try:
+                    acks = [await self._timebox.submit(packet) for packet in packets]
+                except Exception as e:  # pylint: disable=broad-except
+                    logging.error('Send failed: %r', e)
+                    if done:
+                        done.set_result(False)
+                    continue
+                finally:
+                    self._writing = False
+                self._inflight += 1
+                asyncio.ensure_future(self._complete(acks, digest, done, start, self._seq))
+
+    async def _complete(self, acks: List[asyncio.Future], digest: Optional[bytes], done: Optional[Future], start: float, seq: int):
+        written = False
+        try:
+            replies = await asyncio.gather(*acks)
+            self.sent += 1
+            written = True
+            if digest and all(replies) and seq == self._seq:
+                self._acked = digest
+                self._acked_at = time.monotonic()
+        except Exception as e:  # pylint: disable=broad-except
+            logging.error('Send failed: %r', e)
+        finally:
+            self.timer.record(time.perf_counter() - start)
+            self._inflight -= 1
+            if done:
+                done.set_result(written)
+
+    def close(self):
+        self._writer.cancel()
+        if self._keepalive_handle:
+            self._keepalive_handle.cancel()
+
+    def stats(self) -> Dict[str, int]:
+        return {'depth': self.depth(), 'max_depth': self.max_depth, 'sent': self.sent, 'dropped': self.dropped,
+                'suppressed': self.suppressed, 'refreshed': self.refreshed, 'write': self.timer.stats()}
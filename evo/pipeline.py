@@ -0,0 +1,121 @@
+import time
+import queue
+import logging
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+_STOP = object()
+
+
+class StageTimer():
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.last = 0.0
+        self.max = 0.0
+
+    def record(self, elapsed: float):
+        self.count += 1
+        self.total += elapsed
+        self.last = elapsed
+        self.max = max(self.max, elapsed)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'count': self.count,
+            'avg_ms': round(1000 * self.total / self.count, 3) if self.count else 0.0,
+            'last_ms': round(1000 * self.last, 3),
+            'max_ms': round(1000 * self.max, 3),
+        }
+
+
+class Stage():
+    """A worker thread fed by a bounded queue, the oldest item is dropped when the queue is full"""
+
+    def __init__(self, name: str, fn: Callable[[Any], Any], maxsize: int = 1):
+        self.name = name
+        self.timer = StageTimer()
+        self.dropped = 0
+        self._fn = fn
+        self._queue = queue.Queue(maxsize)  # type: queue.Queue
+        self._output = None  # type: Optional[Stage]
+        self._thread = threading.Thread(target=self._run, name='stage-' + name, daemon=True)
+
+    def connect(self, output: 'Stage') -> 'Stage':
+        self._output = output
+        return output
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._queue.put(_STOP)
+
+    def put(self, item: Any):
+        while True:
+            try:
+                self._queue.put_nowait(item)
+                return
+            except queue.Full:
+                try:
+                    self._queue.get_nowait()
+                    self.dropped += 1
+                except queue.Empty:
+                    pass
+
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                break
+
+            start = time.perf_counter()
+            try:
+                result = self._fn(item)
+            except Exception:  # pylint: disable=broad-except
+                logging.error("Stage %s failed", self.name, exc_info=True)
+                continue
+            finally:
+                self.timer.record(time.perf_counter() - start)
+
+            if self._output is not None and result is not None:
+                self._output.put(result)
+
+    def stats(self) -> Dict[str, Any]:
+        result = self.timer.stats()
+        result.update({'depth': self.depth(), 'dropped': self.dropped})
+        return result
+
+
+class Pipeline():
+    """Stages connected in order, work done on the caller thread is recorded with record()"""
+
+    def __init__(self, stages: List[Stage]):
+        self._stages = stages
+        self._timers = {}  # type: Dict[str, StageTimer]
+        for stage, output in zip(stages, stages[1:]):
+            stage.connect(output)
+
+    def start(self):
+        for stage in self._stages:
+            stage.start()
+
+    def stop(self):
+        for stage in self._stages:
+            stage.stop()
+
+    def put(self, item: Any):
+        self._stages[0].put(item)
+
+    def record(self, name: str, elapsed: float):
+        self._timers.setdefault(name, StageTimer()).record(elapsed)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        result = {name: timer.stats() for name, timer in self._timers.items()}
+        for stage in self._stages:
+            result[stage.name] = stage.stats()
+        return result
@@ -0,0 +1,62 @@
+import time
+import asyncio
+from typing import Any, Dict, Optional
+
+
+class RateLimiter():
+    """Token bucket for the bytes written to a device, its rate follows the link
+
+    Every acknowledged command raises the rate a little while its round trip
+    stays close to the best one seen, a slow acknowledgement lowers it
+    slightly and a timeout halves it, much like TCP congestion avoidance.
+    Up to burst seconds worth of bytes can be written back to back.
+    """
+
+    DEFAULT_RATE = 8000.0
+    INCREASE = 0.5
+    SLOW_RTT = 2.0
+
+    def __init__(self, rate: float = DEFAULT_RATE, min_rate: float = 500.0, max_rate: float = 32000.0, burst: float = 0.5):
+        self.rate = rate
+        self._min_rate = min_rate
+        self._max_rate = max_rate
+        self._burst = burst
+        self._tokens = rate * burst
+        self._stamp = time.monotonic()
+        self.rtt = None  # type: Optional[float]
+        self.min_rtt = None  # type: Optional[float]
+        self.waited = 0.0
+        self.timeouts = 0
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.rate * self._burst, self._tokens + (now - self._stamp) * self.rate)
+        self._stamp = now
+
+    async def acquire(self, size: int):
+        """Wait until size bytes may be written"""
+        self._refill()
+        while self._tokens < min(size, self.rate * self._burst):
+            wait = (min(size, self.rate * self._burst) - self._tokens) / self.rate
+            self.waited += wait
+            await asyncio.sleep(wait)
+            self._refill()
+        self._tokens -= size
+
+    def acked(self, size: int, rtt: float):
+        self.rtt = rtt if self.rtt is None else 0.8 * self.rtt + 0.2 * rtt
+        self.min_rtt = rtt if self.min_rtt is None else min(self.min_rtt, rtt)
+
+        if rtt <= self.SLOW_RTT * self.min_rtt + 0.01:
+            self.rate = min(self._max_rate, self.rate + size * self.INCREASE)
+        else:
+            self.rate = max(self._min_rate, self.rate * 0.95)
+
+    def timed_out(self):
+        self.timeouts += 1
+        self.rate = max(self._min_rate, self.rate * 0.5)
+
+    def stats(self) -> Dict[str, Any]:
+        return {'rate': round(self.rate), 'rtt_ms': round((self.rtt or 0.0) * 1000, 3),
+                'min_rtt_ms': round((self.min_rtt or 0.0) * 1000, 3), 'waited_ms': round(self.waited * 1000, 3),
+                'timeouts': self.timeouts}
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""Local stand-in for a Timebox Evo
+
+Listens on tcp://host:port or unix:/path, decodes the frames written by
+EvoEncoder, keeps the image the device would show and answers every
+command like the device does. Point the server at it with
+--address=tcp://127.0.0.1:4000
+"""
+import time
+import random
+import struct
+import asyncio
+import logging
+import argparse
+from typing import Any, Dict, List, Optional, Tuple
+
+from evo.encoder import EvoEncoder, EvoDecoder
+
+RGBColor = Tuple[int, int, int]
+
+
+class Simulator():
+
+    def __init__(self, width: int = 16, height: int = 16, latency: float = 0.0, bandwidth: int = 0,
+                 drop: float = 0.0, view: bool = False):
+        self.width = width
+        self.height = height
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.drop = drop
+        self.view = view
+        self.image = [(0, 0, 0)] * width * height  # type: List[RGBColor]
+        self.animation = []  # type: List[Tuple[List[RGBColor], int]]
+        self.commands = {}  # type: Dict[int, int]
+        self.frames = 0
+        self.bytes = 0
+        self.dropped = 0
+        self.garbled = 0
+        self._chunks = {}  # type: Dict[int, bytes]
+        self._server = None  # type: Optional[Any]
+
+    async def start(self, listen: str):
+        if listen.startswith('unix:'):
+            self._server = await asyncio.start_unix_server(self.handle, listen[len('unix:'):])
+        else:
+            host, _, port = listen[len('tcp://'):].rpartition(':')
+            self._server = await asyncio.start_server(self.handle, host, int(port))
+        logging.info('Simulator listening on %s', listen)
+        return self._server
+
+    def close(self):
+        if self._server:
+            self._server.close()
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        logging.info('Client connected')
+        buffer = bytearray()
+        while True:
+            data = await reader.read(4096)
+            if not data:
+                break
+
+            if self.bandwidth:
+                await asyncio.sleep(len(data) / self.bandwidth)
+            self.bytes += len(data)
+
+            frames, buffer = EvoDecoder.split_frames(buffer + data)
+            for frame in frames:
+                reply = self.process(frame)
+                if self.drop and random.random() < self.drop:
+                    self.dropped += 1
+                    continue
+                if self.latency:
+                    await asyncio.sleep(self.latency)
+                writer.write(reply)
+            await writer.drain()
+
+        logging.info('Client disconnected')
+        writer.close()
+
+    def process(self, frame: bytes) -> bytes:
+        """Apply a command and return the reply the device would send"""
+        command = frame[0]
+        self.frames += 1
+        self.commands[command] = self.commands.get(command, 0) + 1
+
+        try:
+            if command == 0x44:
+                self.image, _ = EvoDecoder.decode_image(frame[5:], self.width * self.height)
+                self.animation = []
+                self.show()
+            elif command == 0x49:
+                self.animation_chunk(frame)
+        except (ValueError, IndexError, struct.error) as e:
+            self.garbled += 1
+            logging.warning('Failed to decode command %02X: %s', command, e)
+
+        return EvoEncoder.encode_bytes(bytes((0x04, command, 0x55)))
+
+    def animation_chunk(self, frame: bytes):
+        total, index = struct.unpack_from('<HB', frame, 1)
+        if index == 0:
+            self._chunks = {}
+        self._chunks[index] = frame[4:]
+
+        data = b''.join(self._chunks[i] for i in sorted(self._chunks))
+        if len(data) >= total:
+            self.animation = [EvoDecoder.decode_image(f, self.width * self.height) for f in EvoDecoder.split_animation(data[:total])]
+            self.image = self.animation[0][0]
+            self._chunks = {}
+            logging.info('Animation with %d frames received', len(self.animation))
+            self.show()
+
+    def show(self):
+        if not self.view:
+            return
+        print('\x1b[0;0H', end='')
+        for y in range(self.height):
+            row = self.image[y * self.width:(y + 1) * self.width]
+            print(''.join('\x1b[38;2;{};{};{}m■'.format(*(c if any(c) else (20, 20, 20))) for c in row))
+        print('\x1b[0m', end='')
+
+    def stats(self) -> Dict[str, Any]:
+        return {'frames': self.frames, 'bytes': self.bytes, 'dropped': self.dropped, 'garbled': self.garbled,
+                'commands': {'{:02X}'.format(k): v for k, v in self.commands.items()}}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Timebox Evo simulator')
+
+    parser.add_argument('-l', '--listen', default='tcp://127.0.0.1:4000', dest='listen', help='tcp://host:port or unix:/path')
+    parser.add_argument('--latency', type=float, default=0.0, dest='latency', help='seconds before each reply')
+    parser.add_argument('--bandwidth', type=int, default=0, dest='bandwidth', help='bytes per second, 0 unlimited')
+    parser.add_argument('--drop', type=float, default=0.0, dest='drop', help='probability that a reply is lost')
+    parser.add_argument('--size', type=int, default=16, dest='size', help='display width and height')
+    parser.add_argument('--view', action='store_true', dest='view', help='draw the display in the terminal')
+
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING if args.view else logging.INFO)
+
+    simulator = Simulator(args.size, args.size, args.latency, args.bandwidth, args.drop, args.view)
+    loop = asyncio.new_event_loop()
+    loop.run_until_complete(simulator.start(args.listen))
+    started = time.time()
+    try:
+        loop.run_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        simulator.close()
+        logging.warning('%s in %.0f s', simulator.stats(), time.time() - started)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+import random
+import asyncio
+import logging
+from enum import Enum
+from typing import Any, Callable, Dict, List, Optional
+
+from evo.timebox import AsyncTimebox
+
+
+class LinkState(Enum):
+    disconnected = 0
+    connecting = 1
+    connected = 2
+
+
+class LinkSupervisor():
+    """Keeps the link to an AsyncTimebox up
+
+    Sends go through the supervisor, which waits while the link is down. A
+    send error, the device closing the connection or max_missed replies in a
+    row that never arrive mark the link as dead, a max_missed of 0 only
+    counts missed replies. It is then reconnected with
+    exponential backoff and jitter, the handshake is replayed and listeners
+    are told so they can re-send what the device should show.
+    """
+
+    def __init__(self, timebox: AsyncTimebox, loop: asyncio.AbstractEventLoop, handshake: Callable[[], List[bytes]],
+                 max_missed: int = 3, backoff: float = 1.0, max_backoff: float = 60.0):
+        self._timebox = timebox
+        self._loop = loop
+        self._handshake = handshake
+        self._max_missed = max_missed
+        self._backoff = backoff
+        self._max_backoff = max_backoff
+        self._connected = asyncio.Event()
+        self._listeners = []  # type: List[Callable[[], Any]]
+        self._task = None  # type: Optional[Any]
+        self._was_connected = False
+        self.state = LinkState.disconnected
+        self.missed = 0
+        self.reconnects = 0
+        self.failures = 0
+
+        timebox.closed_callback = lambda: self._link_lost('closed by device')
+
+    def add_listener(self, fn: Callable[[], Any]):
+        self._listeners.append(fn)
+
+    def start(self):
+        self._loop.call_soon_threadsafe(self._start_connect)
+
+    def connected(self) -> bool:
+        return self.state == LinkState.connected
+
+    def _start_connect(self):
+        if self.state == LinkState.disconnected:
+            self.state = LinkState.connecting
+            self._task = asyncio.ensure_future(self._connect())
+
+    def _link_lost(self, reason: str):
+        if self.state != LinkState.connected:
+            return
+        logging.warning('Link to %s lost: %s', self._timebox.addr, reason)
+        self.state = LinkState.disconnected
+        self._connected.clear()
+        self._timebox.disconnect()
+        self._start_connect()
+
+    async def _connect(self):
+        delay = self._backoff
+        while True:
+            try:
+                logging.info('Connecting to %s', self._timebox.addr)
+                await self._loop.run_in_executor(None, self._timebox.connect)
+                # No settle delay after connecting, the handshake is paced by the replies of the device
+                acks = [await self._timebox.submit(command) for command in self._handshake()]
+                if None in await asyncio.gather(*acks):
+                    raise asyncio.TimeoutError('no reply to handshake')
+                break
+            except Exception as e:  # pylint: disable=broad-except
+                # Anything escaping here would end the task and leave the link connecting for good
+                self.failures += 1
+                self._timebox.disconnect()
+                wait = delay * random.uniform(0.5, 1.0)
+                logging.warning('Connect to %s failed: %r, retrying in %.1f s', self._timebox.addr, e, wait,
+                                exc_info=not isinstance(e, (OSError, asyncio.TimeoutError)))
+                await asyncio.sleep(wait)
+                delay = min(delay * 2, self._max_backoff)
+
+        if self._was_connected:
+            self.reconnects += 1
+        self._was_connected = True
+        self.missed = 0
+        self.state = LinkState.connected
+        self._connected.set()
+        logging.info('Connected to %s', self._timebox.addr)
+
+        for fn in self._listeners:
+            fn()
+
+    async def wait_connected(self):
+        await self._connected.wait()
+
+    async def submit(self, frame: bytes, timeout: float = None) -> asyncio.Future:
+        """Queue frame once the link is up, see AsyncTimebox.submit"""
+        await self._connected.wait()
+        try:
+            ack = await self._timebox.submit(frame, timeout)
+        except (OSError, asyncio.TimeoutError) as e:
+            self._link_lost(repr(e))
+            raise
+        ack.add_done_callback(self._check_reply)
+        return ack
+
+    async def send(self, frame: bytes, timeout: float = None) -> Optional[bytes]:
+        return await (await self.submit(frame, timeout))
+
+    def _check_reply(self, ack: asyncio.Future):
+        if ack.cancelled():
+            return
+        if ack.exception():
+            self._link_lost(repr(ack.exception()))
+        elif ack.result() is None:
+            self.missed += 1
+            if self._max_missed and self.missed >= self._max_missed:
+                self._link_lost('{} replies missing'.format(self.missed))
+        else:
+            self.missed = 0
+
+    def stats(self) -> Dict[str, Any]:
+        return {'state': self.state.name, 'reconnects': self.reconnects, 'failures': self.failures, 'missed': self.missed}
@@ -1,28 +1,56 @@
+import time
 import socket
+import asyncio
 import binascii
 import logging
+from collections import deque
+from concurrent.futures import Future
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+from evo.encoder import EvoEncoder, EvoDecoder
+from evo.ratelimit import RateLimiter
+from evo.pipeline import StageTimer
+
+
+class Pending():
+    """Command waiting for its reply, the timeout runs from when its bytes were written"""
+
+    __slots__ = ('opcode', 'ack', 'length', 'timeout', 'queued', 'written')
+
+    def __init__(self, opcode: int, ack: asyncio.Future, length: int, timeout: float):
+        self.opcode = opcode
+        self.ack = ack
+        self.length = length
+        self.timeout = timeout
+        self.queued = time.monotonic()
+        self.written = None  # type: Optional[float]
 
 
 class Timebox:
+    """Bluetooth address, or tcp://host:port and unix:/path for the simulator"""
     debug = False
 
     def __init__(self, addr, debug=False):
         self.debug = debug
-        socket.setdefaulttimeout(3)
-
-        self.sock = socket.socket(socket.AF_BLUETOOTH, socket.SOCK_STREAM, socket.BTPROTO_RFCOMM)
         self.addr = addr
+        self.sock = None  # type: Optional[socket.socket]
 
-    def connect(self):
-        self.sock.connect((self.addr, 1))
-
-    def disconnect(self):
-        self.sock.close()
+    def create_socket(self) -> socket.socket:
+        if self.addr.startswith('tcp://'):
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            return sock
+        if self.addr.startswith('unix:'):
+            return socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        return socket.socket(socket.AF_BLUETOOTH, socket.SOCK_STREAM, socket.BTPROTO_RFCOMM)
 
-    def send(self, package):
-        if self.debug:
-            print([hex(b)[2:].zfill(2) for b in package])
-        self.sock.send(bytearray(package))
+    def endpoint(self) -> Any:
+        if self.addr.startswith('tcp://'):
+            host, _, port = self.addr[len('tcp://'):].rpartition(':')
+            return (host, int(port))
+        if self.addr.startswith('unix:'):
+            return self.addr[len('unix:'):]
+        return (self.addr, 1)
 
     def decode_bts(self, bts):
 
@@ -53,3 +81,234 @@ class Timebox:
             logging.info('Received: ' + msg)
         except Exception:
             logging.info('Timeout reading data...')
+
+
+class AsyncTimebox(Timebox):
+    """Timebox on a non-blocking socket driven by an asyncio event loop
+
+    Up to window commands are in flight at once. Commands submitted in the
+    same loop iteration, or while the socket is busy, go out together in a
+    single vectored write. A background reader splits the replies into
+    frames and matches each one to the oldest outstanding command with the
+    same opcode, so a slow or missing device never blocks the loop. The
+    reply timeout of a command starts once it is written, not while it
+    waits behind the window or the limiter.
+
+    With a limiter, writes are paced to the rate the link sustains.
+    """
+
+    MAX_BATCH = 64
+
+    def __init__(self, addr, loop: asyncio.AbstractEventLoop, debug=False, timeout: float = 3.0, window: int = 4,
+                 limiter: Optional[RateLimiter] = None):
+        super().__init__(addr, debug)
+        self.timeout = timeout
+        self._loop = loop
+        self._window = asyncio.Semaphore(window)
+        self.limiter = limiter
+        self._pending = deque()  # type: Deque[Pending]
+        self._outgoing = []  # type: List[bytes]
+        self._unsent = []  # type: List[Pending]
+        self._flushing = False
+        self._reader = None  # type: Optional[Any]
+        self.closed_callback = None  # type: Optional[Callable[[], Any]]
+        self.writes = 0
+        self.commands = 0
+        self.timeouts = 0
+        self.unmatched = 0
+        self.timer = StageTimer()
+
+    def connect(self):
+        self.sock = self.create_socket()
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.endpoint())
+        self.sock.setblocking(False)
+        self._reader = asyncio.run_coroutine_threadsafe(self._read(), self._loop)
+
+    def disconnect(self):
+        if self._reader:
+            self._reader.cancel()
+            self._reader = None
+        if self.sock:
+            self.sock.close()
+            self.sock = None
+        if not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._fail_pending, ConnectionError('disconnected'))
+
+    def _fail_pending(self, error: Exception):
+        self._outgoing = []
+        self._unsent = []
+        while self._pending:
+            ack = self._pending.popleft().ack
+            if not ack.done():
+                ack.set_exception(error)
+
+    def connected(self) -> bool:
+        return self.sock is not None
+
+    async def wait_connected(self):
+        pass
+
+    async def _read(self):
+        buffer = bytearray()
+        while self.sock:
+            try:
+                data = await self._loop.sock_recv(self.sock, 256)
+            except OSError as e:
+                logging.warning('Read failed: %r', e)
+                data = b''
+            if not data:
+                logging.warning('Connection closed by device')
+                if self.closed_callback:
+                    self.closed_callback()
+                break
+
+            frames, buffer = EvoDecoder.split_frames(buffer + data)
+            for payload in frames:
+                self._acknowledge(payload)
+
+    def _acknowledge(self, payload: bytes):
+        logging.info('Received: ' + self.decode_bts(EvoEncoder.encode_bytes(payload)))
+
+        opcode = EvoDecoder.reply_opcode(payload)
+        for entry in self._pending:
+            if opcode is None or entry.opcode == opcode:
+                self._pending.remove(entry)
+                if self.limiter and entry.written is not None:
+                    self.limiter.acked(entry.length, time.monotonic() - entry.written)
+                if not entry.ack.done():
+                    entry.ack.set_result(payload)
+                return
+        self.unmatched += 1
+
+    def _expire(self, entry: Pending):
+        if entry in self._pending:
+            self._pending.remove(entry)
+            self.timeouts += 1
+            if self.limiter:
+                self.limiter.timed_out()
+            logging.info('Timeout reading data...')
+            if not entry.ack.done():
+                entry.ack.set_result(None)
+
+    async def submit(self, frame: bytes, timeout: float = None) -> asyncio.Future:
+        """Queue frame for writing once a window slot is free, the future resolves to the reply or None on timeout"""
+        if self.sock is None:
+            raise ConnectionError('not connected')
+        if timeout is None:
+            timeout = self.timeout
+
+        await self._window.acquire()
+        ack = self._loop.create_future()
+        ack.add_done_callback(lambda _: self._window.release())
+        if self.limiter:
+            try:
+                await self.limiter.acquire(len(frame))
+            except asyncio.CancelledError:
+                ack.cancel()
+                raise
+            if self.sock is None:
+                ack.cancel()
+                raise ConnectionError('not connected')
+
+        entry = Pending(frame[3], ack, len(frame), timeout)
+        self._pending.append(entry)
+
+        logging.info('Send: ' + self.decode_bts(frame))
+        self.commands += 1
+        self._outgoing.append(frame)
+        self._unsent.append(entry)
+        if not self._flushing:
+            self._flushing = True
+            self._loop.call_soon(lambda: asyncio.ensure_future(self._flush()))
+        return ack
+
+    async def send(self, frame: bytes, timeout: float = None) -> Optional[bytes]:
+        """Write frame and wait for the reply, None if the device did not answer in time"""
+        return await (await self.submit(frame, timeout))
+
+    async def _flush(self):
+        try:
+            while self._outgoing and self.sock:
+                buffers = self._outgoing[:self.MAX_BATCH]
+                entries = self._unsent[:self.MAX_BATCH]
+                del self._outgoing[:self.MAX_BATCH]
+                del self._unsent[:self.MAX_BATCH]
+                while buffers and self.sock:
+                    try:
+                        sent = self.sock.sendmsg(buffers)
+                        self.writes += 1
+                    except BlockingIOError:
+                        sent = 0
+                    remaining = len(buffers)
+                    buffers = self._consume(buffers, sent)
+                    written = remaining - len(buffers)
+                    for entry in entries[:written]:
+                        self._written(entry)
+                    del entries[:written]
+                    if buffers:
+                        await self._writable()
+        except (OSError, asyncio.TimeoutError) as e:
+            logging.error('Write failed: %r', e)
+            self._fail_pending(e)
+        finally:
+            self._flushing = False
+
+    def _written(self, entry: Pending):
+        """Start the reply timeout of a command whose bytes all went out"""
+        if entry.ack.done():
+            return
+        entry.written = time.monotonic()
+        self.timer.record(entry.written - entry.queued)
+        handle = self._loop.call_later(entry.timeout, self._expire, entry)
+        entry.ack.add_done_callback(lambda _: handle.cancel())
+
+    async def _writable(self):
+        ready = self._loop.create_future()
+        fd = self.sock.fileno()
+        self._loop.add_writer(fd, lambda: ready.done() or ready.set_result(None))
+        try:
+            await asyncio.wait_for(ready, self.timeout)
+        finally:
+            self._loop.remove_writer(fd)
+
+    @classmethod
+    def _consume(cls, buffers: List[bytes], sent: int) -> List[bytes]:
+        index = 0
+        while index < len(buffers) and sent >= len(buffers[index]):
+            sent -= len(buffers[index])
+            index += 1
+        buffers = buffers[index:]
+        if buffers and sent:
+            buffers[0] = buffers[0][sent:]
+        return buffers
+
+    def send_raw(self, bts) -> Future:
+        """Queue bts on the event loop, safe to call from any thread"""
+        future = asyncio.run_coroutine_threadsafe(self.send(bts), self._loop)
+        future.add_done_callback(self._log_failure)
+        return future
+
+    def send_blocking(self, bts):
+        """Blocking write for when the event loop is no longer running"""
+        if self._reader:
+            self._reader.cancel()
+            self._reader = None
+        self.sock.settimeout(self.timeout)
+        super().send_raw(bts)
+
+    @classmethod
+    def _log_failure(cls, future: Future):
+        if not future.cancelled() and future.exception():
+            logging.error('Send failed: %r', future.exception())
+
+    def rate(self) -> Optional[float]:
+        """Bytes per second the link currently sustains, None when not limited"""
+        return self.limiter.rate if self.limiter else None
+
+    def stats(self) -> Dict[str, Any]:
+        stats = {'inflight': len(self._pending), 'commands': self.commands, 'writes': self.writes,
+                 'timeouts': self.timeouts, 'unmatched': self.unmatched, 'write': self.timer.stats()}  # type: Dict[str, Any]
+        if self.limiter:
+            stats['limiter'] = self.limiter.stats()
+        return stats
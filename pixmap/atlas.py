@@ -0,0 +1,135 @@
+import os
+import struct
+import hashlib
+import logging
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from PIL import Image
+
+from pixmap.rawpixmap import RawPixmap
+
+Entry = Tuple[int, bytes, bytes]
+
+
+class SpriteAtlas():
+    """Every image below root decoded once to packed RGB, looked up by name
+
+    Names are paths relative to root without extension, 'sunup' or 'yr/01d'.
+    Decoded images are kept in a cache file together with the mtime and a
+    hash of their source, so a restart only decodes images that changed.
+    A source with a new mtime but the same hash is not decoded again.
+    """
+
+    MAGIC = b'EVOATLAS'
+    VERSION = 1
+    EXTENSIONS = ('.png', '.gif', '.jpg', '.jpeg', '.bmp')
+
+    def __init__(self, root: str, width: int, height: int, cache_path: str = ''):
+        self._root = root
+        self._width = width
+        self._height = height
+        self._cache_path = cache_path
+        self._sprites = {}  # type: Dict[str, bytes]
+        self.decoded = 0
+        self.cached = 0
+
+    def get(self, name: str) -> Optional[bytes]:
+        return self._sprites.get(name)
+
+    def names(self) -> List[str]:
+        return sorted(self._sprites)
+
+    def __len__(self) -> int:
+        return len(self._sprites)
+
+    def _sources(self) -> Iterator[Tuple[str, str]]:
+        for directory, _, files in os.walk(self._root):
+            for filename in sorted(files):
+                base, ext = os.path.splitext(filename)
+                if ext.lower() in self.EXTENSIONS:
+                    path = os.path.join(directory, filename)
+                    name = os.path.relpath(os.path.join(directory, base), self._root).replace(os.sep, '/')
+                    yield name, path
+
+    def load(self):
+        cache = self._read_cache()
+        entries = {}  # type: Dict[str, Entry]
+        decoder = RawPixmap(self._width, self._height)
+
+        for name, path in self._sources():
+            try:
+                mtime = os.stat(path).st_mtime_ns
+                cached = cache.get(name)
+                if cached and cached[0] == mtime:
+                    entries[name] = cached
+                    self.cached += 1
+                    continue
+
+                with open(path, 'rb') as f:
+                    data = f.read()
+                digest = hashlib.blake2b(data, digest_size=16).digest()
+                if cached and cached[1] == digest:
+                    entries[name] = (mtime, digest, cached[2])
+                    self.cached += 1
+                    continue
+
+                with Image.open(path) as img:
+                    entries[name] = (mtime, digest, decoder.decode_packed(img))
+                self.decoded += 1
+            except OSError as e:
+                logging.warning('Failed to load sprite %s: %r', path, e)
+
+        self._sprites = {name: pixels for name, (_, _, pixels) in entries.items()}
+        logging.info('Sprite atlas has %d images, %d decoded, %d from cache', len(self._sprites), self.decoded, self.cached)
+
+        if self._cache_path and entries != cache:
+            self._write_cache(entries)
+
+    def _read_cache(self) -> Dict[str, Entry]:
+        if not self._cache_path:
+            return {}
+        try:
+            with open(self._cache_path, 'rb') as f:
+                data = f.read()
+        except OSError:
+            return {}
+
+        frame = self._width * self._height * 3
+        header = struct.Struct('<8sHHHI')
+        try:
+            magic, version, width, height, count = header.unpack_from(data)
+            if magic != self.MAGIC or version != self.VERSION or (width, height) != (self._width, self._height):
+                return {}
+
+            entries = {}
+            offset = header.size
+            for _ in range(count):
+                length, = struct.unpack_from('<H', data, offset)
+                offset += 2
+                name = data[offset:offset + length].decode('utf-8')
+                offset += length
+                mtime, digest = struct.unpack_from('<q16s', data, offset)
+                offset += 24
+                pixels = data[offset:offset + frame]
+                offset += frame
+                if len(pixels) != frame:
+                    raise ValueError('truncated')
+                entries[name] = (mtime, digest, pixels)
+            return entries
+        except (struct.error, ValueError, UnicodeDecodeError) as e:
+            logging.warning('Ignoring sprite cache %s: %r', self._cache_path, e)
+            return {}
+
+    def _write_cache(self, entries: Dict[str, Entry]):
+        parts = [struct.pack('<8sHHHI', self.MAGIC, self.VERSION, self._width, self._height, len(entries))]
+        for name, (mtime, digest, pixels) in sorted(entries.items()):
+            encoded = name.encode('utf-8')
+            parts.append(struct.pack('<H', len(encoded)) + encoded + struct.pack('<q16s', mtime, digest) + pixels)
+
+        tmp = self._cache_path + '.tmp'
+        try:
+            with open(tmp, 'wb') as f:
+                f.write(b''.join(parts))
+            os.replace(tmp, self._cache_path)
+        except OSError as e:
+            logging.warning('Failed to write sprite cache %s: %r', self._cache_path, e)
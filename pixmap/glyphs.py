@@ -0,0 +1,76 @@
+from functools import lru_cache
+from typing import Dict, List, Sequence, Tuple
+
+from pixmap.fonts import smallFont, bigFont
+
+Bitmap = Sequence[Sequence[int]]
+
+
+class Glyph():
+    """Bitmap compiled to the coordinates of its lit pixels, also used for whole text strips"""
+
+    __slots__ = ('width', 'height', 'points', '_spans', '_scaled')
+
+    def __init__(self, width: int, height: int, points: Tuple[Tuple[int, int], ...]):
+        self.width = width
+        self.height = height
+        self.points = points
+        self._spans = {}  # type: Dict[int, Tuple[Tuple[int, int], ...]]
+        self._scaled = {}  # type: Dict[int, Glyph]
+
+    @classmethod
+    def compile(cls, bitmap: Bitmap) -> 'Glyph':
+        points = tuple((x, y) for y, row in enumerate(bitmap) for x, col in enumerate(row) if col)
+        return cls(max((len(row) for row in bitmap), default=0), len(bitmap), points)
+
+    def scaled(self, factor: int) -> 'Glyph':
+        """The glyph with every pixel a factor x factor block"""
+        if factor == 1:
+            return self
+        glyph = self._scaled.get(factor)
+        if glyph is None:
+            points = tuple((x * factor + dx, y * factor + dy) for x, y in self.points for dy in range(factor) for dx in range(factor))
+            glyph = self._scaled[factor] = Glyph(self.width * factor, self.height * factor, points)
+        return glyph
+
+    def spans(self, stride: int) -> Tuple[Tuple[int, int], ...]:
+        """Runs of lit pixels on a row as (byte offset, pixels) in a packed RGB buffer stride pixels wide"""
+        spans = self._spans.get(stride)
+        if spans is None:
+            runs = []  # type: List[List[int]]
+            for x, y in sorted(self.points, key=lambda point: (point[1], point[0])):
+                offset = (x + y * stride) * 3
+                if runs and runs[-1][0] + runs[-1][1] * 3 == offset:
+                    runs[-1][1] += 1
+                else:
+                    runs.append([offset, 1])
+            spans = self._spans[stride] = tuple((offset, count) for offset, count in runs)
+        return spans
+
+
+def compile_font(font: Dict[str, Bitmap]) -> Dict[str, Glyph]:
+    return {ch: Glyph.compile(bitmap) for ch, bitmap in font.items()}
+
+
+FONTS = {
+    'small': compile_font(smallFont),
+    'big': compile_font(bigFont),
+}
+
+
+@lru_cache(maxsize=256)
+def text_strip(text: str, font: str = 'small', spacing: int = 1) -> Glyph:
+    """Lay out text in one strip, glyphs advance by their width plus spacing, unknown characters leave a digit wide gap"""
+    glyphs = FONTS[font]
+    points = []  # type: List[Tuple[int, int]]
+    x = 0
+    height = 0
+    for ch in text:
+        glyph = glyphs.get(ch)
+        if glyph is None:
+            x += glyphs['0'].width + spacing
+            continue
+        points.extend((x + gx, gy) for gx, gy in glyph.points)
+        height = max(height, glyph.height)
+        x += glyph.width + spacing
+    return Glyph(max(0, x - spacing), height, tuple(points))
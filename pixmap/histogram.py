@@ -1,5 +1,7 @@
 import time
-from typing import List, Dict, Union
+from array import array
+from collections import deque
+from typing import Deque, List, Dict, Optional, Tuple, Union
 from enum import Enum
 
 
@@ -11,6 +13,14 @@ class HistChange(Enum):
 
 
 class Histogram():
+    """Latest samples in a fixed size ring buffer, with the all time min and max
+
+    The window min and max are kept in monotonic queues of (sequence number,
+    value), so adding a sample is O(1) amortized. Normalized points are
+    cached until the next add, then only the new samples are normalized as
+    long as the window min and max stayed where they were.
+    """
+
     def __init__(self, size: int, amplitude: int):
 
         now = int(time.time())
@@ -20,7 +30,14 @@ class Histogram():
         self._value = {'value': 0.0, 'stamp': now}  # type: Dict[str, Union[float, int]]
         self._min = {'value': 100.0, 'stamp': now}  # type: Dict[str, Union[float, int]]
         self._max = {'value': -100.0, 'stamp': now}  # type: Dict[str, Union[float, int]]
-        self._points = []  # type: List[float]
+        self._ring = array('d', bytes(8 * size))
+        self._added = 0
+        self._lows = deque()  # type: Deque[Tuple[int, float]]
+        self._highs = deque()  # type: Deque[Tuple[int, float]]
+        self._normalized = deque()  # type: Deque[Tuple[float, int]]
+        self._pending = []  # type: List[float]
+        self._scale = None  # type: Optional[Tuple[float, float]]
+        self._points = None  # type: Optional[List[Tuple[float, int]]]
 
     def width(self) -> int:
         return self._size
@@ -32,6 +49,53 @@ class Histogram():
         self._min = self._value.copy()
         self._max = self._value.copy()
 
+    def __len__(self) -> int:
+        return min(self._added, self._size)
+
+    def _last(self) -> Optional[float]:
+        if not self._added or not self._size:
+            return None
+        return self._ring[(self._added - 1) % self._size]
+
+    def _append(self, val: float):
+        seq = self._added
+        self._added += 1
+        self._points = None
+        if not self._size:
+            return
+        self._ring[seq % self._size] = val
+
+        lows, highs = self._lows, self._highs
+        while lows and lows[-1][1] >= val:
+            lows.pop()
+        lows.append((seq, val))
+        while highs and highs[-1][1] <= val:
+            highs.pop()
+        highs.append((seq, val))
+        while lows[0][0] <= seq - self._size:
+            lows.popleft()
+        while highs[0][0] <= seq - self._size:
+            highs.popleft()
+        if len(self._pending) < self._size:
+            self._pending.append(val)
+
+    def _window_scale(self) -> Optional[Tuple[float, float]]:
+        if not self._lows:
+            return None
+        mn = self._lows[0][1]
+        return mn, max(self._highs[0][1] - mn, 0.5)
+
+    def _amplitude(self, val: float, scale: Tuple[float, float]) -> int:
+        mn, extent = scale
+        return round((val - mn) * self._amp / extent)
+
+    def _window(self) -> List[float]:
+        """Samples in the window, oldest first"""
+        count = len(self)
+        start = (self._added - count) % self._size if self._size else 0
+        ring = self._ring
+        return ring[start:start + count].tolist() + ring[:max(0, start + count - self._size)].tolist()
+
     def add(self, val: float, epoch: int) -> HistChange:
         result = HistChange.no_change
 
@@ -45,17 +109,14 @@ class Histogram():
             self._max['stamp'] = epoch
             result = HistChange.max_changed
 
-        if self._points and val == self._points[-1]:
+        if self._added and val == self._last():
             self._value['stamp'] = epoch
             return result
 
-        self._points.append(val)
+        self._append(val)
         self._value['value'] = val
         self._value['stamp'] = epoch
 
-        if len(self._points) > self._size:
-            self._points.pop(0)
-
         if result == HistChange.no_change:
             result = HistChange.value_changed
 
@@ -71,15 +132,18 @@ class Histogram():
         return self._max
 
     def points(self) -> List:
-        ret = []
-
-        if self._points:
-            mn, mx = min(self._points), max(self._points)
-            extent = mx - mn
-            if extent < 0.5:
-                extent = 0.5
-
-            for _, v in enumerate(self._points):
-                amp = round((v - mn) * self._amp / extent) if extent != 0 else 0
-                ret.append((v, amp))
-        return ret
+        """Samples in the window, oldest first, with their amplitude between 0 and height"""
+        if self._points is None:
+            scale = self._window_scale()
+            normalized = self._normalized
+            if scale == self._scale and len(self._pending) < self._size:
+                for val in self._pending:
+                    if len(normalized) == self._size:
+                        normalized.popleft()
+                    normalized.append((val, self._amplitude(val, scale)))
+            else:
+                self._scale = scale
+                self._normalized = deque((v, self._amplitude(v, scale)) for v in self._window())
+            self._pending = []
+            self._points = list(self._normalized)
+        return self._points
@@ -1,10 +1,18 @@
+import os
 import time
 import logging
+from itertools import chain
 
 from enum import Enum
-from typing import Any, Union, List
-from pixmap.rawpixmap import RawPixmap, RGBColor
+from concurrent.futures import Executor
+from typing import Any, Callable, Dict, Optional, Tuple, Union, List
+from pixmap.rawpixmap import RawPixmap, RGBColor, RGBFrame
 from pixmap.histogram import Histogram, HistChange
+from pixmap.quantize import Quantizer
+from pixmap.atlas import SpriteAtlas
+from pixmap.timeline import Timeline, Sequence
+from pixmap.layers import Layer, LayerCache, compose
+from pixmap import transitions
 
 
 class TempType(Enum):
@@ -44,12 +52,62 @@ class ModeType(Enum):
         return members[index]
 
 
+class _Recorder():
+    """Takes the place of Divoom while a mode is rendered off screen"""
+
+    def __init__(self, outer: Any):
+        self._outer = outer
+        self.result = None  # type: Optional[Tuple[str, Any]]
+        self.hold = False
+
+    def send(self):
+        self.result = ('still', self._outer.get_packed_data())
+
+    def send_animation(self, frames: List[RGBFrame], hold: bool = False):
+        self.result = ('animation', frames)
+        self.hold = hold
+
+    def after_delay(self, delay: float, fn: Any):
+        pass
+
+    def cancel_delay(self, handle: Any):
+        pass
+
+
 class HistPixmap(RawPixmap):
 
-    def __init__(self, width: int, height: int, divoom: Any):
+    TRANSITION_STEPS = 8
+    TRANSITION_DELAY = 40
+
+    # Inputs every mode is drawn from, a setter invalidates the modes depending on what it changed
+    DEPENDS = {
+        ModeType.hist: ('value',),
+        ModeType.clock: ('value', 'stamp'),
+        ModeType.min: ('min',),
+        ModeType.max: ('max',),
+        ModeType.image: ('image',),
+        ModeType.sunrise: ('sunrise',),
+        ModeType.sunset: ('sunset',),
+        ModeType.forecastmax: ('forecast',),
+        ModeType.forecastmin: ('forecast',),
+    }
+
+    def __init__(self, width: int, height: int, divoom: Any, quantizer: Quantizer = None, executor: Executor = None,
+                 atlas: SpriteAtlas = None, transition: Optional[str] = None):
         super().__init__(width, height)
-        self._uploaded = [(0, 0, 0)] * width * height  # type: List[RGBColor]
-        self._histogram = Histogram(width - 2, 5)
+        if transition and transition not in transitions.TRANSITIONS:
+            raise ValueError('Unknown transition {}'.format(transition))
+        self._transition = transition
+        self._atlas = atlas
+        self._quantizer = quantizer or Quantizer()
+        self._executor = executor
+        self._uploaded = bytes(width * height * 3)
+        self._uploaded_frames = []  # type: List[RGBFrame]
+        self._cols = width // self._scale
+        self._rows = height // self._scale
+        self._histogram = Histogram(self._cols - 2, 5)
+        self._layers = LayerCache()
+        self._blank = bytes(width * height * 3)
         self._mode = ModeType.hist  # type: ModeType
         self._divoom = divoom
         self._sunrise_epoch = 0
@@ -59,6 +117,14 @@ class HistPixmap(RawPixmap):
         #self._forecast = {"min": {"symbol": "03d", "temp": 2, "timestamp": 1570168800}, "max": {"symbol": "03d", "temp": 6, "timestamp": 1570183200}}
         self._width = width
         self._height = height
+        self._render_start = None  # type: Optional[float]
+        self._timeline = Timeline(self._show, lambda delay, fn: self._divoom.after_delay(delay, fn),
+                                  lambda handle: self._divoom.cancel_delay(handle))
+        self.skipped_redraws = 0
+        self._versions = {name: 0 for names in self.DEPENDS.values() for name in names}  # type: Dict[str, int]
+        self._rendered = {}  # type: Dict[Tuple[ModeType, bool], Tuple[Tuple[int, ...], bytes, Optional[Tuple[str, Any]], bool]]
+        self.cache_hits = 0
+        self.cache_misses = 0
 
     @classmethod
     def _toChar(cls, val) -> str:
@@ -74,18 +140,82 @@ class HistPixmap(RawPixmap):
     def height(self) -> int:
         return self._height
 
+    def _dot(self, x: int, y: int, color: RGBColor):
+        """Pixel in layout units"""
+        if self._scale == 1:
+            self.setPixel(x, y, color)
+        else:
+            self.fill(color, x * self._scale, y * self._scale, self._scale, self._scale)
+
+    def _line(self, x: int, y: int, x2: int, y2: int, color: RGBColor):
+        """Horizontal or vertical line in layout units"""
+        scale = self._scale
+        self.fill(color, min(x, x2) * scale, min(y, y2) * scale, (abs(x2 - x) + 1) * scale, (abs(y2 - y) + 1) * scale)
+
+    def _char(self, ch: str, x: int, y: int, color: RGBColor, font: str = 'big'):
+        """Character in layout units"""
+        if font == 'big':
+            self.charAt(ch, x * self._scale, y * self._scale, color, self._scale)
+        else:
+            self.smallCharAt(ch, x * self._scale, y * self._scale, color, self._scale)
+
+    def _text(self, text: str, x: int, y: int, color: RGBColor, font: str = 'small', spacing: int = 1):
+        """Text in layout units"""
+        self.text(text, x * self._scale, y * self._scale, color, font, spacing, self._scale)
+
     def set_sunrise(self, epoch: int):
         self._sunrise_epoch = epoch
-        self.draw_mode(self._mode)
+        self.invalidate('sunrise')
+        self._redraw()
 
     def set_sunset(self, epoch: int):
         self._sunset_epoch = epoch
-        self.draw_mode(self._mode)
+        self.invalidate('sunset')
+        self._redraw()
 
     def set_forecast(self, forecast: dict):
         self._forecast = forecast
+        self.invalidate('forecast')
+        self._redraw()
+
+    def invalidate(self, *inputs: str):
+        """Drop the cached frames of the modes drawn from inputs, all modes without any"""
+        for name in inputs or self._versions:
+            self._versions[name] += 1
+
+    def _redraw(self):
+        """Draw the selected mode, unless a sequence is playing that draws it when done"""
+        if self._timeline.playing():
+            self.skipped_redraws += 1
+            return
         self.draw_mode(self._mode)
 
+    def _show(self, pixels: bytes):
+        self.set_rgb_pixels(pixels)
+        self._divoom.send()
+
+    def _blink(self, mode: ModeType, count: int):
+        """Alternate mode and its alt rendering every second for count frames, then draw the selected mode"""
+        self._render_start = time.perf_counter()
+        shown = self.snapshot_mode(mode)
+        hidden = self.snapshot_mode(mode, True)
+        if not shown or not hidden or shown[0] != 'still' or hidden[0] != 'still' or shown[1] == hidden[1]:
+            self._timeline.cancel()
+            self.draw_mode(self._mode)
+            return
+
+        keyframes = [(hidden[1] if i % 2 else shown[1], 1.0) for i in range(count)]
+        self._timeline.play(Sequence('blink {}'.format(mode.name), keyframes, lambda: self.draw_mode(self._mode)))
+
+    def timeline_stats(self) -> dict:
+        stats = self._timeline.stats()
+        stats['skipped_redraws'] = self.skipped_redraws
+        return stats
+
+    def render_cache_stats(self) -> dict:
+        return {'size': len(self._rendered), 'hits': self.cache_hits, 'misses': self.cache_misses,
+                'layers': self._layers.stats()}
+
     def set_mode(self, mode: Union[int, str]):
         if isinstance(mode, int):
             self._mode = ModeType(mode)
@@ -96,151 +226,266 @@ class HistPixmap(RawPixmap):
                 self._mode = self._mode.prev()
 
         logging.info("Mode %s selected", self._mode)
-        self.draw_mode(self._mode)
+        self._timeline.cancel()
+        if self._transition:
+            self._draw_transition(self._mode)
+        else:
+            self.draw_mode(self._mode)
+
+    def _draw_transition(self, mode: ModeType):
+        """Draw mode after a transition from what is shown now, animated modes play without one"""
+        before = self.get_packed_data()
+        snapshot = self.snapshot_mode(mode)
+        if not snapshot or snapshot[0] != 'still':
+            self.draw_mode(mode)
+            return
+
+        after = snapshot[1]
+        frames = transitions.TRANSITIONS[self._transition](before, after, self._width, self._height, self.TRANSITION_STEPS)
+        # Blends and the two frames side by side can hold more colours than the encoder takes
+        frames = [self._quantizer.reduce(frame) for frame in frames]
+        self.set_rgb_pixels(after)
+        self._divoom.send_animation([(self.unpack(frame), self.TRANSITION_DELAY) for frame in frames], True)
+
+    def take_render_time(self) -> Optional[float]:
+        """Seconds spent in the current draw_mode, None when the frame was not drawn by draw_mode"""
+        if self._render_start is None:
+            return None
+        elapsed = time.perf_counter() - self._render_start
+        self._render_start = None
+        return elapsed
+
+    def mode_key(self, mode: ModeType) -> Tuple[int, ...]:
+        """Versions of the inputs mode is drawn from, it changes whenever the rendered frame may"""
+        return tuple(self._versions[name] for name in self.DEPENDS[mode])
 
     def draw_mode(self, mode: ModeType, alt: bool = False):
-        self.clear()
+        """Show mode, redrawn only when an input it depends on changed since it was last drawn"""
+        self._render_start = time.perf_counter()
         logging.info("Drawing mode %s", mode)
 
+        key = self.mode_key(mode)
+        entry = self._rendered.get((mode, alt))
+        if entry is not None and entry[0] == key:
+            self.cache_hits += 1
+            self.set_rgb_pixels(entry[1])
+        else:
+            self.cache_misses += 1
+            entry = (key,) + self._render(mode, alt)
+            self._rendered[(mode, alt)] = entry
+
+        _, _, content, hold = entry
+        if content is None:
+            return
+        if content[0] == 'still':
+            self._divoom.send()
+        else:
+            self._divoom.send_animation(content[1], hold)
+
+    def _render(self, mode: ModeType, alt: bool) -> Tuple[bytes, Optional[Tuple[str, Any]], bool]:
+        """Draw mode into the pixmap, the resulting pixels and what it sends are returned instead of sent"""
+        recorder = _Recorder(self)
+        divoom = self._divoom
+        self._divoom = recorder
+        try:
+            self._draw(mode, alt)
+        finally:
+            self._divoom = divoom
+        return self.get_packed_data(), recorder.result, recorder.hold
+
+    def _draw(self, mode: ModeType, alt: bool):
+        self.clear()
+
         if mode == ModeType.hist:
             current = self._histogram.current()
-            self.draw_temp(current['value'])
-            self.draw_histogram()
+            self._compose(self._blank, [self._temp_layer(current['value']), self._axes_layer(), self._points_layer()])
 
         if mode == ModeType.clock:
             current = self._histogram.current()
-            self.draw_temp(current['value'])
-            self.draw_clock(int(current['stamp']), alt)
+            self._compose(self._blank, [self._temp_layer(current['value']), self._clock_layer(int(current['stamp']), alt)])
 
         if mode == ModeType.min:
             current = self._histogram.min()
-            self.draw_temp(current['value'], alt)
+            layers = [self._temp_layer(current['value'], alt)]
             if not alt:
-                self.draw_min_arrow(current['value'])
-            self.draw_clock(int(current['stamp']))
+                layers.append(self._layer('min_arrow', current['value'] >= 0.0, lambda: self.draw_min_arrow(current['value'])))
+            self._compose(self._blank, layers + [self._clock_layer(int(current['stamp']))])
 
         if mode == ModeType.max:
             current = self._histogram.max()
-            self.draw_temp(current['value'], alt)
+            layers = [self._temp_layer(current['value'], alt)]
             if not alt:
-                self.draw_max_arrow(current['value'])
-            self.draw_clock(int(current['stamp']))
+                layers.append(self._layer('max_arrow', current['value'] >= 0.0, lambda: self.draw_max_arrow(current['value'])))
+            self._compose(self._blank, layers + [self._clock_layer(int(current['stamp']))])
 
         if mode == ModeType.image:
             self.set_rgb_pixels(self._uploaded)
+            if len(self._uploaded_frames) > 1:
+                self._divoom.send_animation(self._uploaded_frames)
+                return
 
         if mode == ModeType.sunrise:
-            img = super(HistPixmap, self).load_image('backgrounds/sunup.png')
-            pixels = super(HistPixmap, self).decode_image(img)
-
-            self.set_rgb_pixels(pixels)
-            self.draw_clock(self._sunrise_epoch)
+            self._compose(self._background('sunup', reserve=1), [self._clock_layer(self._sunrise_epoch)])
 
         if mode == ModeType.sunset:
-            img = super(HistPixmap, self).load_image('backgrounds/sundown.png')
-            pixels = super(HistPixmap, self).decode_image(img)
-
-            self.set_rgb_pixels(pixels)
-            self.draw_clock(self._sunset_epoch)
+            self._compose(self._background('sundown', reserve=1), [self._clock_layer(self._sunset_epoch)])
 
         if mode == ModeType.forecastmax:
             if 'max' not in self._forecast:
                 return
-            self.draw_forecast_symbol('max')
-            self._divoom.send()
-            time.sleep(1)
-            self.draw_forecast('max')
+            self._divoom.send_animation(self.draw_forecast('max'), True)
+            return
 
         if mode == ModeType.forecastmin:
             if 'min' not in self._forecast:
                 return
-
-            self.draw_forecast_symbol('min')
-            self._divoom.send()
-            time.sleep(1)
-            self.draw_forecast('min')
+            self._divoom.send_animation(self.draw_forecast('min'), True)
+            return
 
         self._divoom.send()
 
+    def _layer(self, name: str, key: Any, draw: Callable[[], Any]) -> Layer:
+        """What draw puts on a cleared pixmap as a layer, drawn again only for new inputs"""
+        def raster() -> bytes:
+            self.clear()
+            draw()
+            return self.get_packed_data()
+        return self._layers.get(name, key, raster)
+
+    def _compose(self, base: bytes, layers: List[Layer]):
+        self.set_rgb_pixels(compose(base, layers))
+
+    def _temp_layer(self, val: float, alt: bool = False) -> Layer:
+        return self._layer('temp', (val, alt), lambda: self.draw_temp(val, alt))
+
+    def _clock_layer(self, epoch: int, alt: bool = False) -> Layer:
+        # The clock only shows hours and minutes, every stamp within a minute shares the layer
+        return self._layer('clock', (time.localtime(epoch)[3:5], alt), lambda: self.draw_clock(epoch, alt))
+
+    def _axes_layer(self) -> Layer:
+        return self._layer('axes', self._histogram.height(), self.draw_histogram_axes)
+
+    def _points_layer(self) -> Layer:
+        return self._layer('points', self._versions['value'], self.draw_histogram_points)
+
+    @classmethod
+    def _image_key(cls, path: str, *args) -> Any:
+        try:
+            return (path, os.stat(path).st_mtime_ns) + args
+        except OSError:
+            return None
+
+    def _decode_quantized(self, path: str, dim: bool = False, reserve: int = 0) -> bytes:
+        img = super(HistPixmap, self).load_image(path)
+        pixels = super(HistPixmap, self).decode_packed(img, dim)
+        return self._quantizer.reduce(pixels, self._image_key(path, dim), reserve)
+
+    def _background(self, name: str, reserve: int = 0) -> bytes:
+        """Image from backgrounds/ by name, from the atlas when it has it"""
+        pixels = self._atlas.get(name) if self._atlas else None
+        if pixels is None:
+            return self._decode_quantized('backgrounds/{}.png'.format(name), reserve=reserve)
+        return self._quantizer.reduce(pixels, ('atlas', name), reserve)
+
+    def snapshot_mode(self, mode: ModeType, alt: bool = False) -> Optional[Tuple[str, Any]]:
+        """Render mode off screen, ('still', packed rgb) or ('animation', frames), the shown frame is kept"""
+        recorder = _Recorder(self)
+        divoom, pixels, render_start = self._divoom, self.get_packed_data(), self._render_start
+        marks = (set(self._dirty), self._all_dirty, None if self._lit is None else set(self._lit))
+        self._divoom = recorder
+        try:
+            self.draw_mode(mode, alt)
+        finally:
+            self._divoom = divoom
+            self.set_rgb_pixels(pixels)
+            self._dirty, self._all_dirty, self._lit = marks
+            self._render_start = render_start
+        return recorder.result
+
     def load_image(self, path: str):
         img = super(HistPixmap, self).load_image(path)
-        pixels = super(HistPixmap, self).decode_image(img)
 
-        self._uploaded = list(pixels)
+        if getattr(img, 'n_frames', 1) > 1:
+            frames = super(HistPixmap, self).decode_frames(img, executor=self._executor)
+            key = self._image_key(path)
+            self._uploaded_frames = [(self._quantizer.reduce(pixels, key and key + (i,)), delay) for i, (pixels, delay) in enumerate(frames)]
+            logging.info("Loaded animation with %d frames", len(self._uploaded_frames))
+        else:
+            pixels = super(HistPixmap, self).decode_packed(img)
+            self._uploaded_frames = [(self.unpack(self._quantizer.reduce(pixels, self._image_key(path, False))), 0)]
+
+        self._uploaded = bytes(chain.from_iterable(self._uploaded_frames[0][0]))
+        self.invalidate('image')
         self.set_mode(int(ModeType.image))
 
     def reset_min_max(self):
         self._histogram.reset_min_max()
+        self.invalidate('min', 'max')
+        self._timeline.cancel()
         self.draw_mode(self._mode)
 
     def add_temp(self, val: float, epoch: int):
 
         val = float(self._format_temp(val))
+        extremes = (dict(self._histogram.min()), dict(self._histogram.max()))
         change = self._histogram.add(val, epoch)
 
+        # The histogram reports one change, the first value moves both min and max
+        self.invalidate('stamp')
+        if change != HistChange.no_change:
+            self.invalidate('value')
+        if self._histogram.min() != extremes[0]:
+            self.invalidate('min')
+        if self._histogram.max() != extremes[1]:
+            self.invalidate('max')
+
         logging.info("New temp %s added, status=%s", val, change)
 
         if change == HistChange.min_changed:
-            self.draw_mode(ModeType.min)
-            self._divoom.after_delay(1, lambda: self.draw_mode(ModeType.min, True))
-            self._divoom.after_delay(2, lambda: self.draw_mode(ModeType.min))
-            self._divoom.after_delay(3, lambda: self.draw_mode(ModeType.min, True))
-            self._divoom.after_delay(4, lambda: self.draw_mode(ModeType.min))
-            self._divoom.after_delay(5, lambda: self.draw_mode(self._mode))
+            self._blink(ModeType.min, 5)
 
         if change == HistChange.max_changed:
-            self.draw_mode(ModeType.max)
-            self._divoom.after_delay(1, lambda: self.draw_mode(ModeType.max, True))
-            self._divoom.after_delay(2, lambda: self.draw_mode(ModeType.max))
-            self._divoom.after_delay(3, lambda: self.draw_mode(ModeType.max, True))
-            self._divoom.after_delay(4, lambda: self.draw_mode(ModeType.max))
-            self._divoom.after_delay(5, lambda: self.draw_mode(self._mode))
+            self._blink(ModeType.max, 5)
 
         if change == HistChange.no_change:
-            self.draw_mode(self._mode)
+            self._redraw()
 
         if change == HistChange.value_changed:
-            self.draw_mode(self._mode)
-            self._divoom.after_delay(1, lambda: self.draw_mode(self._mode, True))
-            self._divoom.after_delay(2, lambda: self.draw_mode(self._mode))
+            self._blink(self._mode, 2)
 
     def draw_clock(self, epoch: int, alt: bool = False):
         if not alt:
             t = time.localtime(epoch)
 
-            tens = t.tm_hour / 10
-            ones = t.tm_hour % 10
-
-            self.smallCharAt(HistPixmap._toChar(tens), 0, 10, RawPixmap.WHITE)
-            self.smallCharAt(HistPixmap._toChar(ones), 4, 10, RawPixmap.WHITE)
-
-            tens = t.tm_min / 10
-            ones = t.tm_min % 10
-
-            self.smallCharAt(HistPixmap._toChar(tens), 9, 10, RawPixmap.WHITE)
-            self.smallCharAt(HistPixmap._toChar(ones), 13, 10, RawPixmap.WHITE)
+            self._text('{:02d}'.format(t.tm_hour), 0, 10, RawPixmap.WHITE)
+            self._text('{:02d}'.format(t.tm_min), 9, 10, RawPixmap.WHITE)
 
     def draw_histogram(self):
+        self.draw_histogram_axes()
+        self.draw_histogram_points()
+
+    def draw_histogram_axes(self):
         hh = self._histogram.height()
 
-        self.line(0, self._height - hh - 2, 0, self._height - 1, RawPixmap.WHITE)
-        self.line(0, self._height - 1, self._width - 1, self._height - 1, RawPixmap.WHITE)
-        self.line(self._width - 1, self._height - hh - 2, self._width - 1, self._height - 1, RawPixmap.WHITE)
+        self._line(0, self._rows - hh - 2, 0, self._rows - 1, RawPixmap.WHITE)
+        self._line(0, self._rows - 1, self._cols - 1, self._rows - 1, RawPixmap.WHITE)
+        self._line(self._cols - 1, self._rows - hh - 2, self._cols - 1, self._rows - 1, RawPixmap.WHITE)
 
+    def draw_histogram_points(self):
         for i, v in enumerate(reversed(self._histogram.points())):
             (val, amp) = v
             if val < 0:
-                self.setPixel(self._width - 2 - i, self._height - 2 - amp, RawPixmap.DEG_MINUS)
+                self._dot(self._cols - 2 - i, self._rows - 2 - amp, RawPixmap.DEG_MINUS)
             else:
-                self.setPixel(self._width - 2 - i, self._height - 2 - amp, RawPixmap.DEG_PLUS)
+                self._dot(self._cols - 2 - i, self._rows - 2 - amp, RawPixmap.DEG_PLUS)
 
     def draw_min_arrow(self, val: float):
         color = self.temp_color(val)
-        self.line(1, 1, 1, 5, color)
+        self._line(1, 1, 1, 5, color)
 
     def draw_max_arrow(self, val: float):
         color = self.temp_color(val)
-        self.line(1, 7, 1, 3, color)
+        self._line(1, 7, 1, 3, color)
 
     def temp_color(self, val: float) -> RGBColor:
         color = RawPixmap.DEG_MINUS
@@ -256,57 +501,49 @@ class HistPixmap(RawPixmap):
         if not alt:
             # Draw sign
             if val >= 0.0:
-                self.smallCharAt('+', 0, 2, color)
+                self._char('+', 0, 2, color, 'small')
             else:
-                self.smallCharAt('-', 0, 2, color)
+                self._char('-', 0, 2, color, 'small')
 
         # Draw the value
         if -10.0 < val < 10.0:  # if val > -10.0 and val < 10.0:
             deg = abs(val)
             decimal = (abs(val) * 10) % 10
 
-            self.charAt(HistPixmap._toChar(deg), 4, 1, color)
+            self._char(HistPixmap._toChar(deg), 4, 1, color)
 
             # Decimal point
-            self.setPixel(10, 7, color)
+            self._dot(10, 7, color)
 
             # Decimal value
-            self.smallCharAt(HistPixmap._toChar(decimal), 12, 3, color)
+            self._char(HistPixmap._toChar(decimal), 12, 3, color, 'small')
 
         else:
-            tens = int(abs(val) / 10)
-            ones = int(abs(val) % 10)
-
-            self.charAt(HistPixmap._toChar(tens), 4, 1, color)
-            self.charAt(HistPixmap._toChar(ones), 10, 1, color)
+            self._text('{:02d}'.format(int(abs(val))), 4, 1, color, 'big', 0)
 
     def draw_forecast_symbol(self, min_or_max: str):
-        img = super(HistPixmap, self).load_image('backgrounds/yr/{}.png'.format(self._forecast[min_or_max]['symbol']))
-        pixels = super(HistPixmap, self).decode_image(img, False)
-        self.set_rgb_pixels(pixels)
+        self.set_rgb_pixels(self._background('yr/{}'.format(self._forecast[min_or_max]['symbol']), reserve=2))
 
-    def draw_forecast(self, min_or_max: str):
+    def draw_forecast(self, min_or_max: str) -> List[RGBFrame]:
+        """Forecast symbol followed by a fade to the temperature, as animation frames"""
 
-        brightness = 1.0
-        source = self.get_rgb_pixels().copy()
+        self.draw_forecast_symbol(min_or_max)
+        source = self.get_packed_data()
+
+        self.clear()
+        self.draw_forecast_temp(self._forecast[min_or_max]['temp'])
+        self.draw_clock(self._forecast[min_or_max]['timestamp'])
+        top = self.get_packed_data()
 
+        levels = []
+        brightness = 1.0
         for _ in range(11):
             brightness -= 0.05
-            for y in range(self._height):
-                for x in range(self._width):
-                    #(r, g, b) = self.getPixel(x, y)
-                    (r, g, b) = source[(x % self._width) + (y % self._height) * self._width]
-                    self.setPixel(x, y, (int(r * brightness), int(g * brightness), int(b * brightness)))
-            
-            self.draw_forecast_temp(self._forecast[min_or_max]['temp'])
-            self.draw_clock(self._forecast[min_or_max]['timestamp'])
-
-            self._divoom.send()
-            time.sleep(0.05)
+            levels.append(brightness)
+        faded = transitions.overlay(transitions.dim(source, levels), top, transitions.pixel_mask(top))
 
-        #self.draw_clock(self._forecast[min_or_max]['timestamp'])
-        #self.draw_forecast_temp(self._forecast[min_or_max]['temp'])
-        #self._divoom.send()
+        self.set_rgb_pixels(faded[-1])
+        return [(self.unpack(source), 1000)] + [(self.unpack(frame), 50) for frame in faded]
 
     def draw_forecast_temp(self, val: float):
 
@@ -323,11 +560,11 @@ class HistPixmap(RawPixmap):
             signpos = 2
 
         if tens > 0:
-            self.charAt(HistPixmap._toChar(tens), 4, 1, color)
+            self._char(HistPixmap._toChar(tens), 4, 1, color)
 
-        self.charAt(HistPixmap._toChar(ones), 10, 1, color)
+        self._char(HistPixmap._toChar(ones), 10, 1, color)
 
         if val >= 0.0:
-            self.smallCharAt('+', signpos, 2, color)
+            self._char('+', signpos, 2, color, 'small')
         else:
-            self.smallCharAt('-', signpos, 2, color)
+            self._char('-', signpos, 2, color, 'small')
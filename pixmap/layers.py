@@ -0,0 +1,62 @@
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, Iterable, Tuple
+
+from pixmap.transitions import pixel_mask
+
+
+class Layer():
+    """Packed RGB drawn on black, covers what is below it wherever it is not black
+
+    Pixels and mask are kept as big integers, so compositing a layer is one
+    masked copy of the whole frame with a single and and or.
+    """
+
+    __slots__ = ('pixels', '_over', '_keep')
+
+    def __init__(self, pixels: bytes):
+        self.pixels = pixels
+        self._over = int.from_bytes(pixels, 'big')
+        self._keep = int.from_bytes(pixel_mask(pixels), 'big') ^ ((1 << (len(pixels) * 8)) - 1)
+
+    def over(self, frame: int) -> int:
+        """Masked copy onto a frame held as one big integer"""
+        return (frame & self._keep) | self._over
+
+
+def compose(base: bytes, layers: Iterable[Layer]) -> bytes:
+    """Layers over base, bottom first"""
+    frame = int.from_bytes(base, 'big')
+    for layer in layers:
+        frame = layer.over(frame)
+    return frame.to_bytes(len(base), 'big')
+
+
+class LayerCache():
+    """Rasterized layers by name and the inputs they were drawn from, the least recently used are dropped"""
+
+    def __init__(self, size: int = 32):
+        self._size = size
+        self._layers = OrderedDict()  # type: OrderedDict[Tuple[str, Hashable], Layer]
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, name: str, key: Hashable, draw: Callable[[], bytes]) -> Layer:
+        """Cached layer, draw returns its pixels when inputs key were not drawn before"""
+        cache_key = (name, key)
+        layer = self._layers.get(cache_key)
+        if layer is not None:
+            self.hits += 1
+            self._layers.move_to_end(cache_key)
+            return layer
+
+        self.misses += 1
+        layer = self._layers[cache_key] = Layer(draw())
+        if len(self._layers) > self._size:
+            self._layers.popitem(last=False)
+        return layer
+
+    def clear(self):
+        self._layers.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {'size': len(self._layers), 'hits': self.hits, 'misses': self.misses}
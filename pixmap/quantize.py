@@ -0,0 +1,133 @@
+import math
+import logging
+from collections import Counter, OrderedDict
+from itertools import chain, combinations
+from typing import Dict, Hashable, List, Tuple, Union
+
+from PIL import Image
+
+RGBColor = Tuple[int, int, int]
+Pixels = Union[List[RGBColor], bytes]
+
+
+def redmean(c1: RGBColor, c2: RGBColor) -> float:
+    """Cheap perceptual colour distance, 0 - 765"""
+    rmean = (c1[0] + c2[0]) / 2
+    dr = c1[0] - c2[0]
+    dg = c1[1] - c2[1]
+    db = c1[2] - c2[2]
+    return math.sqrt((2 + rmean / 256) * dr * dr + 4 * dg * dg + (2 + (255 - rmean) / 256) * db * db)
+
+
+class Quantizer():
+    """Limit the number of colours in a frame before it is encoded
+
+    Frames with more than max_colours colours are reduced with median cut.
+    With a budget > 0, near colours are merged until the palette reaches the
+    next lower power of two, which saves one bit per pixel on the wire, as
+    long as no colour moves further than budget.
+    """
+
+    def __init__(self, max_colours: int = 256, budget: float = 0.0, cache_size: int = 32):
+        self._max = max_colours
+        self._budget = budget
+        self._cache_size = cache_size
+        self._mappings = OrderedDict()  # type: OrderedDict[Hashable, Dict[RGBColor, RGBColor]]
+
+    def reduce(self, pixels: Pixels, key: Hashable = None, reserve: int = 0) -> Pixels:
+        """Quantize a list of colours or packed RGB, reserve is the number of colours that will be drawn on top"""
+        mapping = None
+        if key is not None:
+            key = (key, reserve)
+            mapping = self._mappings.get(key)
+            if mapping is not None:
+                self._mappings.move_to_end(key)
+                if not mapping:
+                    return pixels
+
+        packed = isinstance(pixels, (bytes, bytearray))
+        colours = list(zip(pixels[0::3], pixels[1::3], pixels[2::3])) if packed else pixels
+
+        if mapping is None:
+            mapping = self._mapping(colours, reserve)
+            if key is not None and self._cache_size > 0:
+                self._mappings[key] = mapping
+                if len(self._mappings) > self._cache_size:
+                    self._mappings.popitem(last=False)
+
+        if not mapping:
+            return pixels
+        reduced = [mapping.get(p, p) for p in colours]
+        return bytes(chain.from_iterable(reduced)) if packed else reduced
+
+    def _mapping(self, pixels: List[RGBColor], reserve: int) -> Dict[RGBColor, RGBColor]:
+        counts = Counter(pixels)
+        mapping = {}  # type: Dict[RGBColor, RGBColor]
+
+        limit = max(1, self._max - reserve)
+        if len(counts) > limit:
+            mapping = self._median_cut(pixels, limit)
+            reduced = Counter()  # type: Counter
+            for colour, count in counts.items():
+                reduced[mapping[colour]] += count
+            counts = reduced
+            logging.info("Quantized %d colours to %d", len(mapping), len(counts))
+
+        if self._budget > 0:
+            merged = self._merge(counts, reserve)
+            if merged:
+                mapping = {c: merged.get(q, q) for c, q in mapping.items()} if mapping else {}
+                for colour, target in merged.items():
+                    mapping.setdefault(colour, target)
+
+        return {c: q for c, q in mapping.items() if c != q}
+
+    @staticmethod
+    def _median_cut(pixels: List[RGBColor], colours: int) -> Dict[RGBColor, RGBColor]:
+        img = Image.new('RGB', (len(pixels), 1))
+        img.putdata(pixels)
+        quantized = img.quantize(colors=colours, method=Image.MEDIANCUT).convert('RGB')
+        return dict(zip(pixels, quantized.getdata()))
+
+    def _merge(self, counts: Counter, reserve: int) -> Dict[RGBColor, RGBColor]:
+        total = len(counts) + reserve
+        if total <= 2 or total & (total - 1) == 0:
+            return {}
+
+        goal = (1 << (int(math.ceil(math.log(total, 2))) - 1)) - reserve
+        if goal < 1:
+            return {}
+
+        parent = {c: c for c in counts}
+        members = {c: [c] for c in counts}
+        weight = dict(counts)
+
+        def find(c: RGBColor) -> RGBColor:
+            while parent[c] != c:
+                c = parent[c]
+            return c
+
+        clusters = len(counts)
+        pairs = sorted((redmean(a, b), a, b) for a, b in combinations(counts, 2))
+
+        for dist, a, b in pairs:
+            if dist > self._budget:
+                break
+            ra, rb = find(a), find(b)
+            if ra == rb:
+                continue
+            keep, drop = (ra, rb) if weight[ra] >= weight[rb] else (rb, ra)
+            if any(redmean(m, keep) > self._budget for m in members[drop]):
+                continue
+            parent[drop] = keep
+            members[keep] += members.pop(drop)
+            weight[keep] += weight[drop]
+            clusters -= 1
+            if clusters <= goal:
+                break
+
+        if clusters > goal:
+            return {}
+
+        logging.info("Merged %d colours to %d", len(counts), clusters)
+        return {c: find(c) for c in counts if find(c) != c}
@@ -1,13 +1,23 @@
+import struct
 import logging
-from typing import Tuple, List
+from itertools import chain
+from concurrent.futures import Executor
+from typing import Iterable, List, Optional, Set, Tuple, Union
 
-from PIL import Image, ImageEnhance
-from pixmap.fonts import smallFont, bigFont
+from PIL import Image, ImageEnhance, ImageSequence
+from pixmap.glyphs import FONTS, Glyph, text_strip
 
 RGBColor = Tuple[int, int, int]
+RGBFrame = Tuple[List[RGBColor], int]
 
 
 class RawPixmap():
+    """Packed RGB framebuffer
+
+    Writes are tracked so that commit() only has to compare the pixels that
+    were touched since the previous commit. Clearing the pixmap touches the
+    pixels drawn since the last clear, replacing all pixels touches all.
+    """
 
     BLACK = (0, 0, 0)
     WHITE = (255, 255, 255)
@@ -18,34 +28,161 @@ class RawPixmap():
     DEG_PLUS = (255, 128, 128)
     DEG_MINUS = (128, 128, 255)
 
+    # Modes are laid out for a 16x16 display, larger displays scale the layout by whole multiples
+    LAYOUT_SIZE = 16
+
     def __init__(self, width: int, height: int):
 
         self._width = width
         self._height = height
-        self._pixels = [(0, 0, 0)] * width * height  # type: List[RGBColor]
+        self._scale = max(1, min(width, height) // self.LAYOUT_SIZE)
+        self._fb = bytearray(width * height * 3)
+        self._committed = bytearray(width * height * 3)
+        self._dirty = set()  # type: Set[int]
+        self._all_dirty = False
+        self._lit = set()  # type: Optional[Set[int]]
         self.clear()
 
     def clear(self):
-        for i, _ in enumerate(self._pixels):
-            self._pixels[i] = self.BLACK
+        self._fb[:] = bytes(len(self._fb))
+        if self._lit is None:
+            self._all_dirty = True
+        elif not self._all_dirty:
+            self._dirty |= self._lit
+        self._lit = set()
+
+    def _touch(self, indexes: Iterable[int]):
+        """Mark pixel indexes as written, indexes must be iterable twice"""
+        if not self._all_dirty:
+            self._dirty.update(indexes)
+        if self._lit is not None:
+            self._lit.update(indexes)
+
+    def _touch_all(self):
+        self._all_dirty = True
+        self._dirty = set()
+        self._lit = None
+
+    def _touch_rect(self, x: int, y: int, width: int, height: int):
+        if x == 0 and y == 0 and width == self._width and height == self._height:
+            self._touch_all()
+            return
+        for line in range(y, y + height):
+            self._touch(range(line * self._width + x, line * self._width + x + width))
+
+    def commit(self) -> List[Tuple[int, int, RGBColor]]:
+        """Pixels changed since the last commit as (x, y, colour), the current pixels become the committed ones"""
+        fb = self._fb
+        committed = self._committed
+        width = self._width
+        changed = []  # type: List[Tuple[int, int, RGBColor]]
+        if self._all_dirty:
+            # Rows compare as one slice, only rows that differ are compared pixel by pixel
+            stride = width * 3
+            for y, row in enumerate(range(0, len(fb), stride)):
+                new = fb[row:row + stride]
+                old = committed[row:row + stride]
+                if new != old:
+                    changed.extend((x, y, colour) for x, (colour, previous) in
+                                   enumerate(zip(zip(new[0::3], new[1::3], new[2::3]), zip(old[0::3], old[1::3], old[2::3])))
+                                   if colour != previous)
+            committed[:] = fb
+        else:
+            for i in sorted(self._dirty):
+                offset = i * 3
+                pixel = fb[offset:offset + 3]
+                if pixel != committed[offset:offset + 3]:
+                    committed[offset:offset + 3] = pixel
+                    changed.append((i % width, i // width, tuple(pixel)))
+        self._dirty = set()
+        self._all_dirty = False
+        return changed
+
+    def committed_pixels(self) -> List[RGBColor]:
+        """Pixels as of the last commit"""
+        return self.unpack(self._committed)
+
+    def fill(self, color: RGBColor, x: int = 0, y: int = 0, width: int = None, height: int = None):
+        """Fill a rectangle, the whole pixmap by default, clipped to the pixmap"""
+        x, y, width, height = self._clip(x, y, self._width if width is None else width, self._height if height is None else height)
+        if width <= 0 or height <= 0:
+            return
+        self._touch_rect(x, y, width, height)
+        row = bytes(color) * width
+        for line in range(y, y + height):
+            offset = (line * self._width + x) * 3
+            self._fb[offset:offset + len(row)] = row
+
+    def blit(self, data: bytes, x: int, y: int, width: int, height: int):
+        """Copy a width x height block of packed RGB to x, y, clipped to the pixmap"""
+        cx, cy, cw, ch = self._clip(x, y, width, height)
+        if cw <= 0 or ch <= 0:
+            return
+        self._touch_rect(cx, cy, cw, ch)
+        src = memoryview(data)
+        for line in range(ch):
+            offset = ((cy + line - y) * width + cx - x) * 3
+            dst = ((cy + line) * self._width + cx) * 3
+            self._fb[dst:dst + cw * 3] = src[offset:offset + cw * 3]
+
+    def copy(self, x: int, y: int, width: int, height: int) -> bytes:
+        """Packed RGB of a rectangle, the rectangle must lie within the pixmap"""
+        if x == 0 and width == self._width:
+            return bytes(self._fb[y * width * 3:(y + height) * width * 3])
+        return b''.join(self._fb[((y + line) * self._width + x) * 3:((y + line) * self._width + x + width) * 3]
+                        for line in range(height))
+
+    def _clip(self, x: int, y: int, width: int, height: int) -> Tuple[int, int, int, int]:
+        x2 = min(self._width, x + width)
+        y2 = min(self._height, y + height)
+        x = max(0, x)
+        y = max(0, y)
+        return x, y, x2 - x, y2 - y
 
     def setPixel(self, x: int, y: int, color: RGBColor):
-        self._pixels[(x % self._width) + (y % self._height) * self._width] = color
+        i = (x % self._width) + (y % self._height) * self._width
+        if not self._all_dirty:
+            self._dirty.add(i)
+        if self._lit is not None:
+            self._lit.add(i)
+        i *= 3
+        self._fb[i], self._fb[i + 1], self._fb[i + 2] = color
 
     def getPixel(self, x: int, y: int) -> RGBColor:
-        return self._pixels[(x % self._width) + (y % self._height) * self._width]
-
-    def charAt(self, ch: str, x: int, y: int, color: RGBColor):
-        for i, row in enumerate(bigFont.get(ch, ())):
-            for j, col in enumerate(row):
-                if col:
-                    self.setPixel(x + j, y + i, color)
-
-    def smallCharAt(self, ch: str, x: int, y: int, color: RGBColor):
-        for i, row in enumerate(smallFont.get(ch, ())):
-            for j, col in enumerate(row):
-                if col:
-                    self.setPixel(x + j, y + i, color)
+        i = ((x % self._width) + (y % self._height) * self._width) * 3
+        return self._fb[i], self._fb[i + 1], self._fb[i + 2]
+
+    def draw_glyph(self, glyph: Glyph, x: int, y: int, color: RGBColor):
+        """Draw the lit pixels of a glyph or text strip with its top left at x, y, clipped to the pixmap"""
+        fb = self._fb
+        rgb = bytes(color)
+        if 0 <= x and x + glyph.width <= self._width and 0 <= y and y + glyph.height <= self._height:
+            base = (x + y * self._width) * 3
+            for offset, count in glyph.spans(self._width):
+                fb[base + offset:base + offset + count * 3] = rgb * count
+            self._touch([base // 3 + gx + gy * self._width for gx, gy in glyph.points])
+            return
+
+        for gx, gy in glyph.points:
+            px = x + gx
+            py = y + gy
+            if 0 <= px < self._width and 0 <= py < self._height:
+                offset = (px + py * self._width) * 3
+                fb[offset:offset + 3] = rgb
+                self._touch((px + py * self._width,))
+
+    def text(self, text: str, x: int, y: int, color: RGBColor, font: str = 'small', spacing: int = 1, scale: int = 1):
+        self.draw_glyph(text_strip(text, font, spacing).scaled(scale), x, y, color)
+
+    def charAt(self, ch: str, x: int, y: int, color: RGBColor, scale: int = 1):
+        glyph = FONTS['big'].get(ch)
+        if glyph:
+            self.draw_glyph(glyph.scaled(scale), x, y, color)
+
+    def smallCharAt(self, ch: str, x: int, y: int, color: RGBColor, scale: int = 1):
+        glyph = FONTS['small'].get(ch)
+        if glyph:
+            self.draw_glyph(glyph.scaled(scale), x, y, color)
 
     def line(self, x: int, y: int, x2: int, y2: int, color: RGBColor):
         """Brensenham line algorithm"""
@@ -84,14 +221,31 @@ class RawPixmap():
             d = d + (2 * dy)
         self.setPixel(x2, y2, color)
 
-    def set_rgb_pixels(self, data: List[RGBColor]):
-        self._pixels = list(data)
+    def set_rgb_pixels(self, data: Union[List[RGBColor], bytes]):
+        """Replace all pixels, from a list of colours or packed RGB"""
+        self._touch_all()
+        if isinstance(data, (bytes, bytearray, memoryview)):
+            self._fb[:] = data
+        else:
+            self._fb[:] = bytes(chain.from_iterable(data))
 
     def get_rgb_pixels(self) -> List[RGBColor]:
-        return self._pixels
+        return self.unpack(self._fb)
 
     def get_pixel_data(self) -> List[int]:
-        return [(t[0] << 16) + (t[1] << 8) + t[2] for t in self._pixels]
+        fb = self._fb
+        words = bytearray(len(fb) // 3 * 4)
+        words[1::4] = fb[0::3]
+        words[2::4] = fb[1::3]
+        words[3::4] = fb[2::3]
+        return list(struct.unpack('>%dI' % (len(fb) // 3), words))
+
+    def get_packed_data(self) -> bytes:
+        return bytes(self._fb)
+
+    def frame_buffer(self) -> memoryview:
+        """Read only view of the packed RGB pixels, row by row, without copying"""
+        return memoryview(self._fb).toreadonly()
 
     def load_image(self, path: str) -> Image:
         try:
@@ -102,42 +256,62 @@ class RawPixmap():
             logging.warning('Failed to load image')
             return Image.new('RGBA', (self._width, self._height), color='black')
 
-    @classmethod
-    def blend_value(cls, under, over, a):
-        return int((over * a + under * (255 - a)) / 255)
-
-    @classmethod
-    def blend_rgba(cls, under, over):
-        return tuple([cls.blend_value(under[i], over[i], over[3]) for i in (0, 1, 2)] + [255])
-
-    def decode_image(self, image: Image, dim: bool = False) -> List[RGBColor]:
+    def decode_packed(self, image: Image, dim: bool = False) -> bytes:
+        """Fit image into the pixmap, centered on black, as packed RGB
 
+        JPEGs are decoded at reduced scale. On displays larger than the
+        layout, images that fit the pixmap more than once are enlarged by a
+        whole multiple so pixel art stays sharp.
+        RGBA images have their alpha flattened onto black, all with bulk PIL
+        operations.
+        """
         w = self._width
         h = self._height
 
         image_mode = image.mode
-        target = Image.new('RGBA', (w, h), color='black')
+        if image_mode != 'RGBA':
+            image.draft(None, (w, h))
 
         source = image.convert('RGBA')
         if dim:
-            enhancer = ImageEnhance.Brightness(source)
-            source = enhancer.enhance(0.5)
+            source = ImageEnhance.Brightness(source).enhance(0.5)
 
-        if source.size[0] != w or source.size[1] != h:
+        if source.size != (w, h):
             source.thumbnail((w, h), Image.BICUBIC)
+            factor = min(w // source.size[0], h // source.size[1]) if self._scale > 1 else 1
+            if factor > 1:
+                source = source.resize((source.size[0] * factor, source.size[1] * factor), Image.NEAREST)
 
         if image_mode == 'RGBA':
-            # Alpha to black
-            for y in range(source.size[1]):
-                for x in range(source.size[0]):
-                    source.putpixel((x, y), self.blend_rgba((0, 0, 0, 255), source.getpixel((x, y))))
+            source = Image.alpha_composite(Image.new('RGBA', source.size, self.BLACK), source)
 
-        offset = ((w - source.size[0]) // 2, (h - source.size[1]) // 2)
-        target.paste(source, offset)
+        if source.size != (w, h):
+            target = Image.new('RGB', (w, h), self.BLACK)
+            target.paste(source.convert('RGB'), ((w - source.size[0]) // 2, (h - source.size[1]) // 2))
+            source = target
 
-        target = target.convert('RGB')
+        return source.convert('RGB').tobytes()
 
-        return list(target.getdata())
+    def decode_image(self, image: Image, dim: bool = False) -> List[RGBColor]:
+        return self.unpack(self.decode_packed(image, dim))
+
+    @staticmethod
+    def unpack(data: bytes) -> List[RGBColor]:
+        """Packed RGB to a list of colours"""
+        return list(zip(data[0::3], data[1::3], data[2::3]))
+
+    def decode_frames(self, image: Image, max_frames: int = 60, executor: Executor = None) -> List[RGBFrame]:
+        """Decode all frames of an animated image, with frame durations in milliseconds"""
+        frames = []
+        durations = []
+        for frame in ImageSequence.Iterator(image):
+            frames.append(frame.convert('RGBA'))
+            durations.append(int(frame.info.get('duration', 100)))
+            if len(frames) >= max_frames:
+                break
+
+        decoded = executor.map(self.decode_image, frames) if executor else map(self.decode_image, frames)
+        return list(zip(decoded, durations))
 
     def view(self):
         def rgb_fg(r: int, g: int, b: int) -> str:
@@ -156,11 +330,7 @@ class RawPixmap():
             print(''.join(res))
 
     def pixel_list(self) -> List[RGBColor]:
-        result = []
-        for y in range(self._height):
-            for x in range(self._width):
-                result.append(self.getPixel(x, y))
-        return result
+        return self.get_rgb_pixels()
 
     # def to_json(self) -> str:
     #     pixmap = []
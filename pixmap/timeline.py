@@ -0,0 +1,77 @@
+import logging
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+Keyframe = Tuple[bytes, float]
+
+
+class Sequence():
+    """Keyframes rendered ahead of time, packed RGB and the seconds each one is shown
+
+    done is called after the last keyframe was shown for its time, unless
+    the sequence was cancelled.
+    """
+
+    def __init__(self, name: str, keyframes: List[Keyframe], done: Callable[[], Any] = None):
+        self.name = name
+        self.keyframes = keyframes
+        self.done = done
+        self.cancelled = False
+
+
+class Timeline():
+    """Plays one Sequence at a time
+
+    Starting a sequence cancels the one playing, so overlapping requests
+    never interleave. Each tick pushes only the keyframe that is due and
+    schedules the next one, a cancelled sequence has its pending tick
+    removed and never pushes again.
+    """
+
+    def __init__(self, show: Callable[[bytes], Any], after_delay: Callable[[float, Callable], Any], cancel_delay: Callable[[Any], Any]):
+        self._show = show
+        self._after_delay = after_delay
+        self._cancel_delay = cancel_delay
+        self._current = None  # type: Optional[Sequence]
+        self._pending = None  # type: Any
+        self.played = 0
+        self.cancelled = 0
+        self.pushed = 0
+
+    def play(self, sequence: Sequence):
+        self.cancel()
+        self._current = sequence
+        self.played += 1
+        self._tick(sequence, 0)
+
+    def cancel(self):
+        if self._current is None:
+            return
+        logging.debug('Cancelling sequence %s', self._current.name)
+        self._current.cancelled = True
+        self._current = None
+        self.cancelled += 1
+        if self._pending is not None:
+            self._cancel_delay(self._pending)
+            self._pending = None
+
+    def playing(self) -> Optional[str]:
+        return self._current.name if self._current else None
+
+    def _tick(self, sequence: Sequence, index: int):
+        if sequence.cancelled:
+            return
+        self._pending = None
+
+        if index >= len(sequence.keyframes):
+            self._current = None
+            if sequence.done:
+                sequence.done()
+            return
+
+        pixels, duration = sequence.keyframes[index]
+        self.pushed += 1
+        self._show(pixels)
+        self._pending = self._after_delay(duration, lambda: self._tick(sequence, index + 1))
+
+    def stats(self) -> Dict[str, Any]:
+        return {'playing': self.playing(), 'played': self.played, 'cancelled': self.cancelled, 'pushed': self.pushed}
@@ -0,0 +1,76 @@
+from functools import lru_cache
+from typing import Callable, Dict, List, Sequence
+
+Transition = Callable[[bytes, bytes, int, int, int], List[bytes]]
+
+
+@lru_cache(maxsize=64)
+def brightness_lut(level: float) -> bytes:
+    """Translation table scaling a channel value by level, truncating like int(v * level)"""
+    return bytes(min(255, int(v * level)) for v in range(256))
+
+
+def dim(pixels: bytes, levels: Sequence[float]) -> List[bytes]:
+    """Packed RGB scaled to every brightness level, one translate per frame"""
+    return [pixels.translate(brightness_lut(level)) for level in levels]
+
+
+_NONZERO = bytes([0]) + bytes([0xFF]) * 255
+
+
+def pixel_mask(pixels: bytes) -> bytes:
+    """0xFF for all three channels of every pixel that is not black, 0x00 otherwise"""
+    channels = pixels.translate(_NONZERO)
+    lit = (int.from_bytes(channels[0::3], 'big') | int.from_bytes(channels[1::3], 'big') |
+           int.from_bytes(channels[2::3], 'big')).to_bytes(len(pixels) // 3, 'big')
+    mask = bytearray(len(pixels))
+    mask[0::3] = lit
+    mask[1::3] = lit
+    mask[2::3] = lit
+    return bytes(mask)
+
+
+def overlay(frames: List[bytes], top: bytes, mask: bytes) -> List[bytes]:
+    """Replace the pixels under mask in every frame with those of top"""
+    size = len(top)
+    keep = int.from_bytes(mask, 'big') ^ ((1 << (size * 8)) - 1)
+    over = int.from_bytes(top, 'big')
+    return [((int.from_bytes(frame, 'big') & keep) | over).to_bytes(size, 'big') for frame in frames]
+
+
+def _add(a: bytes, b: bytes) -> bytes:
+    # Channels never sum above 255, so adding as one big integer does not carry between bytes
+    return (int.from_bytes(a, 'big') + int.from_bytes(b, 'big')).to_bytes(len(a), 'big')
+
+
+def fade(before: bytes, after: bytes, width: int, height: int, steps: int) -> List[bytes]:  # pylint: disable=unused-argument
+    """Fade out to black and in again"""
+    half = max(1, steps // 2)
+    out = dim(before, [1.0 - (i + 1) / half for i in range(half)])
+    return out + dim(after, [(i + 1) / (steps - half or 1) for i in range(max(1, steps - half))])
+
+
+def crossfade(before: bytes, after: bytes, width: int, height: int, steps: int) -> List[bytes]:  # pylint: disable=unused-argument
+    result = []
+    for i in range(steps):
+        t = (i + 1) / steps
+        result.append(_add(before.translate(brightness_lut(1.0 - t)), after.translate(brightness_lut(t))))
+    return result
+
+
+def wipe(before: bytes, after: bytes, width: int, height: int, steps: int) -> List[bytes]:
+    """Uncover after from left to right"""
+    result = []
+    stride = width * 3
+    for i in range(steps):
+        edge = (width * (i + 1) // steps) * 3
+        result.append(b''.join(after[row:row + edge] + before[row + edge:row + stride]
+                               for row in range(0, height * stride, stride)))
+    return result
+
+
+TRANSITIONS = {
+    'fade': fade,
+    'crossfade': crossfade,
+    'wipe': wipe,
+}  # type: Dict[str, Transition]
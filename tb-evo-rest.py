@@ -10,7 +10,8 @@ import uuid
 import time
 import atexit
 import datetime
-from typing import Any, Callable, Union, List
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Tuple, Union, List
 
 from apscheduler.schedulers.tornado import TornadoScheduler
 
@@ -23,56 +24,196 @@ from tornado.log import LogFormatter
 
 import tornado.websocket
 
-from pixmap.histpixmap import HistPixmap, RGBColor
+from pixmap.histpixmap import HistPixmap, ModeType, RGBColor, RGBFrame
+from pixmap.quantize import Quantizer
+from pixmap.atlas import SpriteAtlas
 
-from evo.timebox import Timebox
-from evo.encoder import EvoEncoder
+from evo.device import Device
+from evo.encoder import EvoEncoder, AnimationFrame
+from evo.framecache import FrameCache
+from evo.pipeline import Pipeline, Stage
+
+
+# Content or its packets, the devices to send it to and for a group with its own mode, that mode and its cache key
+Job = Tuple[Tuple[str, Any], List[Device], Optional[Tuple[ModeType, Any]]]
+Encoded = Tuple[List[bytes], List[Device], Optional[Tuple[ModeType, Any]]]
 
 
 class Divoom():
     def __init__(self):
-        self._hist_pix = HistPixmap(16, 16, self)
-        self._timebox = Timebox(options.address, True)
+        self._executor = ThreadPoolExecutor(max_workers=4)
+        self._width, self._height = self.parse_size(options.size)
+        self._atlas = SpriteAtlas('backgrounds', self._width, self._height, options.atlas_cache)
+        self._atlas.load()
+        self._hist_pix = HistPixmap(self._width, self._height, self, Quantizer(budget=options.quantize_budget), self._executor,
+                                    self._atlas, options.transition or None)
+        self._frame_cache = FrameCache(options.frame_cache, self._width, self._height)
+        self._thinned = 0
+        self._hold = None  # type: Any
+        self._pipeline = Pipeline([Stage('encode', self._deliver)])
+        self._pipeline.start()
         self._ioloop = ioloop
 
-        if options.address:
-            self._timebox.connect()
-            time.sleep(3)
-            self.set_time(0)
+        self._devices = []  # type: List[Device]
+        self._groups = {}  # type: Dict[Optional[ModeType], List[Device]]
+        self._dispatched = {}  # type: Dict[ModeType, Tuple[int, ...]]
+        for spec in options.address:
+            address, mode = self.parse_address(spec)
+            device = Device(address, ioloop.asyncio_loop, self.handshake, options.keepalive, mode and mode.name, options.window,
+                            options.max_rate, options.max_missed)
+            self._devices.append(device)
+            self._groups.setdefault(mode, []).append(device)
+            device.start()
 
-            plain = EvoEncoder.encode_hex('450001020100000000FF00')
-            #plain = EvoEncoder.encode_hex('450100FF00300000000000')
-            #plain = EvoEncoder.encode_hex('4502')
-            #plain = EvoEncoder.encode_hex('5F0A06')
-
-            self._timebox.send_raw(plain)
-            time.sleep(3)
+        self.set_mode(0)
 
-            plain = EvoEncoder.encode_hex('0801')
-            self._timebox.send_raw(plain)
+    @staticmethod
+    def parse_size(spec: str) -> Tuple[int, int]:
+        """'32' or '32x32' to width and height"""
+        width, _, height = spec.lower().partition('x')
+        size = (int(width), int(height or width))
+        if min(size) < 1:
+            raise ValueError('Invalid display size {}'.format(spec))
+        return size
 
-        self.set_mode(0)
+    @staticmethod
+    def parse_address(spec: str) -> Tuple[str, Optional[ModeType]]:
+        """'ADDR' or 'ADDR@mode' to the address and the mode the device always shows"""
+        address, mode = Device.parse(spec)
+        if mode is None:
+            return address, None
+        if mode not in ModeType.__members__:
+            raise ValueError('Unknown mode {} in address {}, one of {}'.format(mode, spec, ', '.join(ModeType.__members__)))
+        return address, ModeType[mode]
+
+    def after_delay(self, delay: float, fn: Callable) -> Any:
+        return self._ioloop.add_timeout(time.time() + delay, fn)
+
+    def cancel_delay(self, handle: Any):
+        self._ioloop.remove_timeout(handle)
+
+    def _cancel_hold(self):
+        """A newer frame replaces the one an earlier animation would re-send when it ends"""
+        if self._hold is not None:
+            self.cancel_delay(self._hold)
+            self._hold = None
 
-    def after_delay(self, delay: int, fn: Callable):
-        self._ioloop.add_timeout(time.time() + delay, fn)
+    @classmethod
+    def time_command(cls, offset=0) -> bytes:
+        dt = datetime.datetime.now()
+        if offset != 0:
+            dt += datetime.timedelta(minutes=offset)
+        cmd = [0x18, dt.year % 100, int(dt.year / 100), dt.month, dt.day, dt.hour, dt.minute, dt.second]
+        return EvoEncoder.encode_bytes(bytes(cmd))
+
+    def handshake(self) -> List[bytes]:
+        """Commands sent every time the link to the device comes up"""
+        return [
+            self.time_command(0),
+            EvoEncoder.encode_hex('450001020100000000FF00'),
+            #EvoEncoder.encode_hex('450100FF00300000000000'),
+            #EvoEncoder.encode_hex('4502'),
+            #EvoEncoder.encode_hex('5F0A06'),
+            EvoEncoder.encode_hex('0801'),
+        ]
 
     def set_time(self, offset=0):
-        if options.address:
-            dt = datetime.datetime.now()
-            if offset != 0:
-                dt += datetime.timedelta(minutes=offset)
-            cmd = [0x18, dt.year % 100, int(dt.year / 100), dt.month, dt.day, dt.hour, dt.minute, dt.second]
-            plain = EvoEncoder.encode_bytes(bytes(cmd))
-            self._timebox.send_raw(plain)
+        command = self.time_command(offset)
+        for device in self._devices:
+            device.put_command(command)
+
+    def _record_render(self):
+        render_time = self._hist_pix.take_render_time()
+        if render_time is not None:
+            self._pipeline.record('render', render_time)
+
+    def _publish(self):
+        """Commit the pixmap, so clients connecting later get the current frame, and send the delta to those connected"""
+        delta = self._hist_pix.commit()
+        if WsHandler.count():
+            WsHandler.broadcast(self.delta_to_json(delta))
 
     def send(self):
-        if WsHandler.count():
-            WsHandler.delta(self._hist_pix.pixel_list())
+        self._record_render()
+        self._cancel_hold()
+        self._publish()
+
+        if self._devices:
+            self._dispatch(('still', self._hist_pix.get_packed_data()))
+
+    def send_animation(self, frames: List[RGBFrame], hold: bool = False):
+        """Upload frames and let the device play them, with hold the current pixmap is shown afterwards"""
+        self._record_render()
+        self._cancel_hold()
+        self._publish()
+
+        if self._devices:
+            self._dispatch(('animation', frames))
+
+        if hold:
+            self._hold = self.after_delay(sum(delay for _, delay in frames) / 1000.0, self.send)
 
-        if options.address:
-            colour_array = self._hist_pix.get_pixel_data()
-            data = EvoEncoder.image_bytes(colour_array)
-            self._timebox.send_raw(data)
+    def _dispatch(self, content: Tuple[str, Any]):
+        """Hand the frame to the pipeline, devices with their own mode get that mode rendered off screen
+
+        A mode whose inputs did not change since its frame was last handed to
+        its devices is skipped, their queues already hold that frame. The key
+        is recorded by _transmit, so a job the stage drops is sent again.
+        """
+        jobs = []
+        for mode, devices in self._groups.items():
+            if mode is None:
+                jobs.append((content, devices, None))
+                continue
+            key = self._hist_pix.mode_key(mode)
+            if self._dispatched.get(mode) == key:
+                continue
+            snapshot = self._hist_pix.snapshot_mode(mode)
+            if snapshot:
+                jobs.append((snapshot, devices, (mode, key)))
+        if jobs:
+            self._pipeline.put(jobs)
+
+    def _deliver(self, jobs: List[Job]):
+        """Encode stage, runs on its own thread, the device queues write the frames from the event loop"""
+        self._transmit(self._encode(jobs))
+
+    def _encode(self, jobs: List[Job]) -> List[Encoded]:
+        """Every distinct frame is encoded once"""
+        result = []
+        for (kind, data), devices, dispatched in jobs:
+            if kind == 'still':
+                packets = [self._frame_cache.image_bytes(data)]
+            else:
+                colour_frames = [([(r << 16) + (g << 8) + b for (r, g, b) in pixels], delay) for pixels, delay in data]
+                packets = self._fit_link(colour_frames, EvoEncoder.animation_bytes(colour_frames), devices)
+            result.append((packets, devices, dispatched))
+        return result
+
+    def _fit_link(self, frames: List[AnimationFrame], packets: List[bytes], devices: List[Device]) -> List[bytes]:
+        """Drop animation frames when the slowest device could not upload them in the time they play"""
+        rates = [device.rate() for device in devices if device.rate()]
+        if not rates or len(frames) < 2:
+            return packets
+
+        budget = min(rates) * sum(delay for _, delay in frames) / 1000.0
+        size = sum(len(packet) for packet in packets)
+        if size <= budget:
+            return packets
+
+        count = max(1, int(len(frames) * budget / size))
+        logging.info('Link sustains %d bytes/s, thinning animation from %d to %d frames', min(rates), len(frames), count)
+        self._thinned += 1
+        return EvoEncoder.animation_bytes(EvoEncoder.thin_frames(frames, count))
+
+    def _transmit(self, jobs: List[Encoded]):
+        """Hand the frames to the devices, each writes from its own queue so a slow one does not hold up the rest"""
+        for packets, devices, dispatched in jobs:
+            for device in devices:
+                device.put_frame(packets)
+            if dispatched:
+                mode, key = dispatched
+                self._dispatched[mode] = key
 
     def set_mode(self, mode: Union[int, str]):
         self._hist_pix.set_mode(mode)
@@ -99,28 +240,34 @@ class Divoom():
         return self._hist_pix.load_image(path)
 
     def pixel_list(self) -> List[RGBColor]:
-        return self._hist_pix.pixel_list()
+        """The frame websocket clients were last sent, deltas apply to it"""
+        return self._hist_pix.committed_pixels()
 
     def pixel_list_to_pixmap_json(self, pl: List[RGBColor]) -> str:
         result = {'type': 'pixmap', 'width': self._hist_pix.width(), 'height': self._hist_pix.height(), 'pixmap': pl}
         return json.dumps(result)
 
     @classmethod
-    def delta_to_json(cls, old: List[RGBColor], current: List[RGBColor]) -> str:
-        result = []
-        for y in range(16):
-            for x in range(16):
-                if old[y * 16 + x] != current[y * 16 + x]:
-                    result.append((x, y, current[y * 16 + x]))
-        return json.dumps({'type': 'delta', 'delta': result})
+    def delta_to_json(cls, delta: List[Tuple[int, int, RGBColor]]) -> str:
+        return json.dumps({'type': 'delta', 'delta': delta})
 
     def shutdown(self):
         logging.info('Divoom shutdown...')
-        if options.address:
-            self.set_time(0)
-            plain = EvoEncoder.encode_hex('450001020100000000FF00')
-            self._timebox.send_raw(plain)
-            self._timebox.disconnect()
+        self._pipeline.stop()
+        for device in self._devices:
+            device.shutdown([self.time_command(0), EvoEncoder.encode_hex('450001020100000000FF00')])
+        self._executor.shutdown(wait=False)
+        logging.info('Divoom stats %s', json.dumps(self.stats()))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'devices': {device.address: device.stats() for device in self._devices},
+            'frame_cache': self._frame_cache.stats(),
+            'pipeline': self._pipeline.stats(),
+            'thinned_animations': self._thinned,
+            'timeline': self._hist_pix.timeline_stats(),
+            'render_cache': self._hist_pix.render_cache_stats(),
+        }
 
 
 class Application(tornado.web.Application):
@@ -144,6 +291,7 @@ class Application(tornado.web.Application):
             (r'/evo/load/(.*)', LoadHandler),
             (r'/evo/forecast', ForecastHandler, {'divoom': self._divoom}),
             (r'/evo/hex/(.*)', HexHandler, {'divoom': self._divoom}),
+            (r'/evo/status(?:/*)', StatusHandler, {'divoom': self._divoom}),
             (r'/evo/assets/(.*)', tornado.web.StaticFileHandler, {'path': os.path.join(os.path.dirname(__file__), 'assets')}),
             (r'/(?:[^/]*)/?', IndexHandler),
         ]
@@ -163,7 +311,6 @@ class WsHandler(tornado.websocket.WebSocketHandler):
 
     def initialize(self, divoom):  # pylint: disable=arguments-differ
         self._divoom = divoom
-        self._pixels = []
 
     def data_received(self, chunk):
         pass
@@ -180,8 +327,7 @@ class WsHandler(tornado.websocket.WebSocketHandler):
         self.set_nodelay(True)
         WsHandler.clients.add(self)
 
-        self._pixels = self._divoom.pixel_list()  # pylint: disable=attribute-defined-outside-init
-        self.write_message(self._divoom.pixel_list_to_pixmap_json(self._pixels))
+        self.write_message(self._divoom.pixel_list_to_pixmap_json(self._divoom.pixel_list()))
 
     def on_close(self):
         logging.info("Client closed connection from %s", self.request.remote_ip)
@@ -204,14 +350,11 @@ class WsHandler(tornado.websocket.WebSocketHandler):
                 pass
 
     @classmethod
-    def delta(cls, pl: List[RGBColor]):
+    def broadcast(cls, message: str):
+        """Every client has the committed frame, so one delta serves all of them"""
         for waiter in cls.clients:
             try:
-                _pixels = waiter.__getattribute__('_pixels')
-                _divoom = waiter.__getattribute__('_divoom')
-                delta = _divoom.delta_to_json(_pixels, pl)
-                waiter.write_message(delta)
-                waiter.__setattr__('_pixels', pl)
+                waiter.write_message(message)
             except Exception:  # pylint: disable=broad-except
                 logging.error("Error sending message", exc_info=True)
 
@@ -294,6 +437,18 @@ class HexHandler(tornado.web.RequestHandler):
         self.set_status(200)
 
 
+class StatusHandler(tornado.web.RequestHandler):
+    def initialize(self, divoom):  # pylint: disable=arguments-differ
+        self._divoom = divoom
+
+    def data_received(self, chunk):
+        pass
+
+    def get(self, *args, **kwargs):
+        self.set_header('Content-Type', 'application/json')
+        self.write(json.dumps(self._divoom.stats()))
+
+
 class SunHandler(tornado.web.RequestHandler):
     def initialize(self, divoom):  # pylint: disable=arguments-differ
         self._divoom = divoom
@@ -471,7 +626,16 @@ def main():
     define('listen', default='127.0.0.1', help='listen address', type=str)
     define('debug', default=False, help='debug', type=bool)
     define("no_ts", default=False, help="timestamp when logging", type=bool)
-    define("address", default='', help="Divoom max address", type=str)
+    define("address", default=[], help="Divoom max address, ADDR or ADDR@mode, comma separated for several", type=str, multiple=True)
+    define('size', default='16x16', help='display resolution, WIDTHxHEIGHT', type=str)
+    define('frame_cache', default=64, help='number of encoded frames to cache', type=int)
+    define('keepalive', default=300.0, help='seconds before an unchanged frame is sent again, 0 never', type=float)
+    define('window', default=4, help='commands in flight per device before waiting for acknowledgements', type=int)
+    define('max_rate', default=32000.0, help='upper bound in bytes/s for the adaptive write rate per device, 0 unlimited', type=float)
+    define('max_missed', default=3, help='missed replies in a row before the link is reconnected, 0 never', type=int)
+    define('atlas_cache', default='backgrounds/.atlas', help='file caching the decoded backgrounds, empty to disable', type=str)
+    define('transition', default='', help='transition between modes, fade, crossfade or wipe, empty for none', type=str)
+    define('quantize_budget', default=0.0, help='max colour error when merging colours to save palette bits', type=float)
     # define('log_file_prefix', default='/var/log/tb-evo-rest.log', help='log file prefix')
 
     tornado.options.parse_command_line()
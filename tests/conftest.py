@@ -0,0 +1,53 @@
+import os
+import sys
+import asyncio
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bench import fixtures  # noqa: E402
+from evo.framecache import FrameCache  # noqa: E402
+from evo.pipeline import Pipeline  # noqa: E402
+from pixmap.histpixmap import HistPixmap  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def repo_root(monkeypatch):
+    """Backgrounds and the server script are found relative to the repository root"""
+    monkeypatch.chdir(ROOT)
+
+
+@pytest.fixture
+def loop():
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+
+@pytest.fixture(scope='session')
+def server():
+    """tb-evo-rest.py loaded as a module, its options are not defined"""
+    cwd = os.getcwd()
+    os.chdir(ROOT)
+    try:
+        return fixtures.load_server()
+    finally:
+        os.chdir(cwd)
+
+
+@pytest.fixture
+def divoom(server):
+    """Divoom without devices, options or an event loop"""
+    divoom = server.Divoom.__new__(server.Divoom)
+    divoom._hist_pix = HistPixmap(16, 16, divoom)
+    divoom._pipeline = Pipeline([])
+    divoom._devices = []
+    divoom._groups = {}
+    divoom._dispatched = {}
+    divoom._frame_cache = FrameCache(8)
+    divoom._executor = None
+    divoom._thinned = 0
+    divoom._hold = None
+    return divoom
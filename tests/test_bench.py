@@ -0,0 +1,25 @@
+from bench import cases, fixtures
+from bench.runner import run_all
+
+
+def test_filtered_run_builds_selected_fixtures_only(monkeypatch):
+    sizes = []
+    histpixmap = fixtures.histpixmap
+
+    def counting(samples=60, size=16):
+        sizes.append(size)
+        return histpixmap(samples, size)
+
+    def not_selected(*args):
+        raise AssertionError('fixture of a benchmark that was not selected')
+
+    monkeypatch.setattr(fixtures, 'histpixmap', counting)
+    monkeypatch.setattr(fixtures, 'background_images', not_selected)
+    monkeypatch.setattr(cases.Simulator, 'start', not_selected)
+
+    benchmarks = cases.all_benchmarks()
+    assert sizes == []
+
+    results = run_all(benchmarks, 2, 'render.draw_mode.hist')
+    assert sorted(results) == ['render.draw_mode.hist', 'render.draw_mode.hist.cold']
+    assert sizes == [16]
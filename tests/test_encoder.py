@@ -0,0 +1,147 @@
+import math
+import random
+import binascii
+from collections import OrderedDict
+
+import pytest
+
+from evo import encoder
+from evo.encoder import EvoEncoder, EvoDecoder
+
+
+def baseline_encode_colours(colour_array):
+    """The hex string encoder the byte encoder replaced"""
+    colour_dict = OrderedDict()
+    colour_order = []
+    for colour in colour_array:
+        if colour not in colour_dict:
+            colour_dict[colour] = len(colour_dict)
+        colour_order.append(colour_dict[colour])
+
+    bits_needed = int(math.ceil(math.log(len(colour_dict), 2))) or 1
+    img_data = '{0:02x}'.format(len(colour_dict) % 256)
+    for colour in colour_dict:
+        img_data += '{0:06x}'.format(colour)
+
+    c_data = ''
+    for i in colour_order:
+        c_data += '{0:08b}'.format(i)[-1::-1][:bits_needed]
+    for i in range(-1, len(c_data) - 1, 8):
+        if i == -1:
+            img_data += '{0:02x}'.format(int(c_data[i + 8::-1], 2))
+            continue
+        img_data += '{0:02x}'.format(int(c_data[i + 8:i:-1], 2))
+    return img_data
+
+
+def baseline_image_bytes(colour_array):
+    return EvoEncoder.encode_hex(b'44000A0A04AA2D00000000' + baseline_encode_colours(colour_array).encode())
+
+
+def frame_colours(colours: int, seed: int = 1, pixels: int = 256):
+    rnd = random.Random(seed)
+    palette = [rnd.randrange(1 << 24) for _ in range(colours)]
+    array = palette + [rnd.choice(palette) for _ in range(pixels - colours)]
+    rnd.shuffle(array)
+    return array
+
+
+@pytest.mark.parametrize('colours', [1, 2, 3, 4, 5, 16, 17, 100, 255, 256])
+def test_matches_baseline_encoder(colours):
+    array = frame_colours(colours, colours)
+    assert EvoEncoder.encode_colours(array) == baseline_encode_colours(array)
+    assert EvoEncoder.image_bytes(array) == baseline_image_bytes(array)
+
+
+def test_too_many_colours():
+    with pytest.raises(ValueError):
+        EvoEncoder.pack_colours(list(range(257)))
+
+
+def test_image_bytes_checks_size():
+    with pytest.raises(ValueError):
+        EvoEncoder.image_bytes([0] * 255)
+
+
+@pytest.mark.parametrize('bits', [1, 3, 5, 8])
+def test_numpy_and_python_index_packing_agree(bits, monkeypatch):
+    if encoder.np is None:
+        pytest.skip('numpy not installed')
+    rnd = random.Random(bits)
+    indexes = [rnd.randrange(1 << bits) for _ in range(4096)]
+    packed = EvoEncoder.pack_indexes(indexes, bits)
+    monkeypatch.setattr(encoder, 'np', None)
+    assert EvoEncoder.pack_indexes(indexes, bits) == packed
+    assert EvoDecoder.unpack_indexes(packed, bits, len(indexes)) == indexes
+
+
+def test_indexes_are_packed_lsb_first():
+    assert EvoEncoder.pack_indexes([1, 0, 0, 0, 0, 0, 0, 0, 1], 1) == b'\x01\x01'
+    assert EvoEncoder.pack_indexes([1, 2, 3], 2) == bytes([0b111001])
+
+
+@pytest.mark.parametrize('size', [16, 32])
+def test_image_round_trip(size):
+    array = frame_colours(200, size, size * size)
+    frames, rest = EvoDecoder.split_frames(bytearray(EvoEncoder.image_bytes(array, size, size)))
+    assert rest == bytearray()
+    assert frames[0][0] == 0x44
+    pixels, delay = EvoDecoder.decode_image(frames[0][5:], size * size)
+    assert delay == 0
+    assert pixels == [((c >> 16) & 0xFF, (c >> 8) & 0xFF, c & 0xFF) for c in array]
+
+
+def test_animation_round_trip():
+    frames = [(frame_colours(n, n), 50 + n) for n in (2, 30, 120, 256)]
+    packets = EvoEncoder.animation_bytes(frames)
+    assert len(packets) > 1
+
+    data = b''
+    for i, packet in enumerate(packets):
+        payloads, _ = EvoDecoder.split_frames(bytearray(packet))
+        assert payloads[0][0] == 0x49 and payloads[0][3] == i
+        data += payloads[0][4:]
+
+    decoded = [EvoDecoder.decode_image(f, 256) for f in EvoDecoder.split_animation(data)]
+    assert [delay for _, delay in decoded] == [delay for _, delay in frames]
+    for (pixels, _), (array, _) in zip(decoded, frames):
+        assert pixels == [((c >> 16) & 0xFF, (c >> 8) & 0xFF, c & 0xFF) for c in array]
+
+
+def test_split_frames_resyncs_and_keeps_partial():
+    frame = EvoEncoder.encode_hex(b'0802')
+    garbled = bytearray(frame)
+    garbled[-2] ^= 0xFF
+    frames, rest = EvoDecoder.split_frames(bytearray(b'\x55') + garbled + frame + frame + frame[:4])
+    assert frames == [binascii.unhexlify(b'0802')] * 2
+    assert rest == bytearray(frame[:4])
+
+
+def test_reply_opcode():
+    assert EvoDecoder.reply_opcode(b'\x04\x44\x55') == 0x44
+    assert EvoDecoder.reply_opcode(b'\x08\x01') is None
+
+
+def test_thin_frames_keeps_total_delay():
+    frames = [([i], 10) for i in range(10)]
+    thinned = EvoEncoder.thin_frames(frames, 3)
+    assert [f[0] for f in thinned] == [[0], [3], [6]]
+    assert sum(d for _, d in thinned) == 100
+    assert EvoEncoder.thin_frames(frames, 20) is frames
+
+
+def test_large_animation_is_thinned():
+    frames = [(frame_colours(256, i, 64 * 64), 100) for i in range(30)]
+    packets = EvoEncoder.animation_bytes(frames)
+    assert len(packets) <= 256
+
+    data = b''.join(EvoDecoder.split_frames(bytearray(packet))[0][0][4:] for packet in packets)
+    assert len(data) <= EvoEncoder.MAX_ANIMATION
+    decoded = [EvoDecoder.decode_image(f, 64 * 64) for f in EvoDecoder.split_animation(data)]
+    assert 1 < len(decoded) < len(frames)
+    assert sum(delay for _, delay in decoded) == 3000
+
+
+def test_oversized_frame_is_rejected():
+    with pytest.raises(ValueError):
+        EvoEncoder.animation_bytes([(frame_colours(256, 1, 232 * 232), 100)])
@@ -0,0 +1,59 @@
+import asyncio
+
+from evo.framequeue import FrameQueue
+
+
+class FakeTimebox():
+    """Acknowledges every packet right away"""
+
+    def __init__(self, loop):
+        self._loop = loop
+        self.written = []
+
+    async def wait_connected(self):
+        pass
+
+    async def submit(self, packet: bytes) -> asyncio.Future:
+        self.written.append(packet)
+        ack = self._loop.create_future()
+        ack.set_result(b'\x04' + packet[:1] + b'\x55')
+        return ack
+
+
+def run(loop, queue, seconds):
+    loop.run_until_complete(asyncio.sleep(seconds))
+    queue.close()
+    loop.run_until_complete(asyncio.sleep(0))
+
+
+def test_duplicate_frame_is_suppressed_and_stale_dropped(loop):
+    timebox = FakeTimebox(loop)
+    queue = FrameQueue(timebox, loop, keepalive=0)
+    queue.put_frame([b'a'])
+    loop.run_until_complete(asyncio.sleep(0.01))
+    queue.put_frame([b'a'])
+    queue.put_frame([b'b'])
+    queue.put_frame([b'c'])
+    run(loop, queue, 0.01)
+    assert timebox.written == [b'a', b'c']
+    assert queue.suppressed == 1
+    assert queue.dropped == 1
+
+
+def test_keepalive_resends_idle_frame(loop):
+    timebox = FakeTimebox(loop)
+    queue = FrameQueue(timebox, loop, keepalive=0.05)
+    queue.put_frame([b'a'])
+    run(loop, queue, 0.18)
+    assert timebox.written[0] == b'a'
+    assert 3 <= len(timebox.written) <= 4
+    assert set(timebox.written) == {b'a'}
+    assert queue.refreshed == len(timebox.written) - 1
+
+
+def test_no_keepalive_without_interval(loop):
+    timebox = FakeTimebox(loop)
+    queue = FrameQueue(timebox, loop, keepalive=0)
+    queue.put_frame([b'a'])
+    run(loop, queue, 0.1)
+    assert timebox.written == [b'a']
@@ -0,0 +1,117 @@
+import random
+
+import pytest
+from PIL import Image
+
+from bench.fixtures import FakeDivoom
+from evo.encoder import EvoEncoder
+from pixmap.histpixmap import HistPixmap, ModeType
+
+EPOCH = 1570168800
+
+
+@pytest.fixture
+def pixmap():
+    pixmap = HistPixmap(16, 16, FakeDivoom())
+    pixmap.set_sunrise(EPOCH)
+    pixmap.add_temp(12.0, EPOCH)
+    pixmap.add_temp(14.0, EPOCH + 60)
+    return pixmap
+
+
+def redrawn(pixmap: HistPixmap, mode: ModeType, alt: bool = False) -> bool:
+    """Whether draw_mode had to render mode instead of using the cached frame"""
+    misses = pixmap.cache_misses
+    pixmap.draw_mode(mode, alt)
+    return pixmap.cache_misses > misses
+
+
+def test_unchanged_mode_is_cached(pixmap):
+    redrawn(pixmap, ModeType.clock)
+    sent = pixmap._divoom.sent
+    assert not redrawn(pixmap, ModeType.clock)
+    assert pixmap._divoom.sent == sent + 1
+    assert redrawn(pixmap, ModeType.clock, True)
+
+
+def test_cached_frame_matches_render(pixmap):
+    for mode in (ModeType.hist, ModeType.clock, ModeType.min, ModeType.sunrise):
+        redrawn(pixmap, mode)
+        assert not redrawn(pixmap, mode)
+        cached = pixmap.get_packed_data()
+        pixmap.invalidate()
+        assert redrawn(pixmap, mode)
+        assert pixmap.get_packed_data() == cached
+
+
+def test_add_temp_invalidates_dependent_modes(pixmap):
+    for mode in (ModeType.clock, ModeType.min, ModeType.max, ModeType.sunrise, ModeType.hist):
+        redrawn(pixmap, mode)
+    before = pixmap.get_packed_data()
+
+    # The new value blinks the selected mode, which renders it again already
+    pixmap.add_temp(13.0, EPOCH + 120)
+    pixmap.draw_mode(ModeType.hist)
+    assert pixmap.get_packed_data() != before
+    assert redrawn(pixmap, ModeType.clock)
+    assert not redrawn(pixmap, ModeType.min)
+    assert not redrawn(pixmap, ModeType.max)
+    assert not redrawn(pixmap, ModeType.sunrise)
+
+    pixmap.draw_mode(ModeType.max)
+    before = pixmap.get_packed_data()
+    pixmap.add_temp(20.0, EPOCH + 180)
+    pixmap.draw_mode(ModeType.max)
+    assert pixmap.get_packed_data() != before
+    assert not redrawn(pixmap, ModeType.min)
+
+
+def test_same_value_only_moves_the_clock(pixmap):
+    redrawn(pixmap, ModeType.hist)
+    redrawn(pixmap, ModeType.clock)
+    pixmap.add_temp(14.0, EPOCH + 120)
+    assert not redrawn(pixmap, ModeType.hist)
+    assert redrawn(pixmap, ModeType.clock)
+
+
+def test_reset_min_max_invalidates_extremes(pixmap):
+    for mode in (ModeType.hist, ModeType.min, ModeType.max):
+        redrawn(pixmap, mode)
+
+    pixmap.reset_min_max()
+    assert redrawn(pixmap, ModeType.min)
+    assert redrawn(pixmap, ModeType.max)
+    assert not redrawn(pixmap, ModeType.hist)
+    assert pixmap.render_cache_stats()['hits'] == pixmap.cache_hits
+
+
+class AnimationDivoom(FakeDivoom):
+    """Keeps the frames of the last animation"""
+
+    def __init__(self):
+        super().__init__()
+        self.frames = []
+
+    def send_animation(self, frames, hold: bool = False):
+        super().send_animation(frames, hold)
+        self.frames = frames
+
+
+@pytest.mark.parametrize('transition', ['fade', 'crossfade', 'wipe'])
+def test_transition_frames_fit_the_encoder(transition, tmp_path):
+    rnd = random.Random(5)
+    noise = Image.new('RGB', (32, 32))
+    noise.putdata([(rnd.randrange(256), rnd.randrange(256), rnd.randrange(256)) for _ in range(32 * 32)])
+    noise.save(str(tmp_path / 'noise.png'))
+
+    divoom = AnimationDivoom()
+    pixmap = HistPixmap(32, 32, divoom, transition=transition)
+    pixmap.set_sunrise(EPOCH)
+    pixmap.load_image(str(tmp_path / 'noise.png'))
+    pixmap.set_mode(int(ModeType.sunrise))
+
+    assert len(divoom.frames) == HistPixmap.TRANSITION_STEPS
+    for pixels, _ in divoom.frames:
+        assert len(set(pixels)) <= 256
+    colour_frames = [([(r << 16) + (g << 8) + b for (r, g, b) in pixels], delay) for pixels, delay in divoom.frames]
+    assert EvoEncoder.animation_bytes(colour_frames)
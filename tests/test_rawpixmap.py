@@ -0,0 +1,109 @@
+import random
+
+from PIL import Image
+
+from pixmap.rawpixmap import RawPixmap
+
+RED = RawPixmap.RED
+BLUE = RawPixmap.BLUE
+BLACK = RawPixmap.BLACK
+
+
+def changes(before, after, width):
+    """Reference delta, every pixel that differs between two frames"""
+    return [(i % width, i // width, colour) for i, (colour, previous) in enumerate(zip(after, before)) if colour != previous]
+
+
+def test_new_pixmap_has_no_changes():
+    pixmap = RawPixmap(4, 4)
+    assert pixmap.commit() == []
+    assert pixmap.committed_pixels() == [BLACK] * 16
+
+
+def test_fill_commits_rectangle():
+    pixmap = RawPixmap(4, 4)
+    pixmap.fill(RED, 1, 1, 2, 2)
+    assert pixmap.commit() == [(1, 1, RED), (2, 1, RED), (1, 2, RED), (2, 2, RED)]
+    assert pixmap.committed_pixels()[5] == RED
+    assert pixmap.commit() == []
+
+
+def test_unchanged_pixels_are_not_reported():
+    pixmap = RawPixmap(4, 4)
+    pixmap.fill(RED, 0, 0, 2, 1)
+    pixmap.commit()
+    pixmap.fill(RED, 0, 0, 3, 1)
+    pixmap.setPixel(0, 0, RED)
+    assert pixmap.commit() == [(2, 0, RED)]
+
+
+def test_set_pixel_and_clear():
+    pixmap = RawPixmap(4, 4)
+    pixmap.setPixel(3, 2, BLUE)
+    assert pixmap.commit() == [(3, 2, BLUE)]
+    pixmap.clear()
+    assert pixmap.commit() == [(3, 2, BLACK)]
+    assert pixmap.committed_pixels() == [BLACK] * 16
+
+
+def test_blit_is_clipped():
+    pixmap = RawPixmap(4, 4)
+    pixmap.blit(bytes(RED) * 2 + bytes(BLUE) * 2, 3, 3, 2, 2)
+    assert pixmap.commit() == [(3, 3, RED)]
+
+
+def test_full_frame_writes_compare_whole_rows():
+    pixmap = RawPixmap(4, 4)
+    pixmap.fill(RED)
+    assert len(pixmap.commit()) == 16
+    pixmap.fill(RED)
+    assert pixmap.commit() == []
+
+    frame = [RED] * 16
+    frame[6] = BLUE
+    pixmap.set_rgb_pixels(frame)
+    assert pixmap.commit() == [(2, 1, BLUE)]
+    assert pixmap.committed_pixels() == frame
+
+
+def test_random_writes_match_full_compare():
+    rnd = random.Random(17)
+    pixmap = RawPixmap(8, 6)
+    colours = [BLACK, RED, BLUE]
+    for _ in range(300):
+        before = pixmap.committed_pixels()
+        for _ in range(rnd.randrange(4)):
+            op = rnd.randrange(5)
+            colour = rnd.choice(colours)
+            if op == 0:
+                pixmap.setPixel(rnd.randrange(8), rnd.randrange(6), colour)
+            elif op == 1:
+                pixmap.fill(colour, rnd.randrange(-2, 8), rnd.randrange(-2, 6), rnd.randrange(1, 5), rnd.randrange(1, 5))
+            elif op == 2:
+                pixmap.blit(bytes(colour) * 4, rnd.randrange(-1, 8), rnd.randrange(-1, 6), 2, 2)
+            elif op == 3:
+                pixmap.clear()
+            elif rnd.random() < 0.2:
+                pixmap.set_rgb_pixels([rnd.choice(colours) for _ in range(48)])
+        assert pixmap.commit() == changes(before, pixmap.get_rgb_pixels(), 8)
+        assert pixmap.committed_pixels() == pixmap.get_rgb_pixels()
+
+
+def small_image():
+    image = Image.new('RGB', (8, 8))
+    image.putdata([(x * 30, y * 30, 90) for y in range(8) for x in range(8)])
+    return image
+
+
+def test_small_image_is_centered_at_layout_size():
+    pixels = RawPixmap(16, 16).decode_image(small_image())
+    for y in range(16):
+        for x in range(16):
+            inside = 4 <= x < 12 and 4 <= y < 12
+            expected = ((x - 4) * 30, (y - 4) * 30, 90) if inside else BLACK
+            assert pixels[y * 16 + x] == expected
+
+
+def test_small_image_is_enlarged_on_larger_display():
+    pixels = RawPixmap(32, 32).decode_image(small_image())
+    assert pixels == [(x // 4 * 30, y // 4 * 30, 90) for y in range(32) for x in range(32)]
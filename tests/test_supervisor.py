@@ -0,0 +1,77 @@
+import asyncio
+
+import pytest
+
+from evo.encoder import EvoEncoder
+from evo.simulator import Simulator
+from evo.supervisor import LinkState, LinkSupervisor
+from evo.timebox import AsyncTimebox
+
+
+@pytest.fixture
+def supervise(loop):
+    """Starts a LinkSupervisor against a simulator and waits for the link"""
+    simulator = Simulator()
+    port = loop.run_until_complete(simulator.start('tcp://127.0.0.1:0')).sockets[0].getsockname()[1]
+    timeboxes = []
+
+    def start(handshake=lambda: [EvoEncoder.encode_hex(b'0801')], **kwargs):
+        timebox = AsyncTimebox('tcp://127.0.0.1:{}'.format(port), loop, timeout=0.1)
+        timeboxes.append(timebox)
+        link = LinkSupervisor(timebox, loop, handshake, backoff=0.01, **kwargs)
+        link.start()
+        loop.run_until_complete(asyncio.wait_for(link.wait_connected(), 1))
+        return link
+
+    yield start
+    for timebox in timeboxes:
+        timebox.disconnect()
+    simulator.close()
+    loop.run_until_complete(asyncio.sleep(0.05))
+
+
+def miss_replies(loop, link, count):
+    for _ in range(count):
+        ack = loop.run_until_complete(link.submit(EvoEncoder.encode_hex(b'0802')))
+        ack.set_result(None)
+        loop.run_until_complete(asyncio.sleep(0))
+
+
+def test_missed_replies_drop_link_by_default(loop, supervise):
+    link = supervise()
+    miss_replies(loop, link, 2)
+    assert link.state == LinkState.connected
+    miss_replies(loop, link, 1)
+    assert link.state != LinkState.connected
+    loop.run_until_complete(asyncio.wait_for(link.wait_connected(), 1))
+    assert link.reconnects == 1
+    assert link.missed == 0
+
+
+def test_reply_resets_missed(loop, supervise):
+    link = supervise()
+    miss_replies(loop, link, 2)
+    assert loop.run_until_complete(link.send(EvoEncoder.encode_hex(b'0802')))
+    miss_replies(loop, link, 2)
+    assert link.state == LinkState.connected
+
+
+def test_max_missed_zero_only_counts(loop, supervise):
+    link = supervise(max_missed=0)
+    miss_replies(loop, link, 5)
+    assert link.missed == 5
+    assert link.state == LinkState.connected
+
+
+def test_unexpected_connect_error_backs_off(supervise):
+    calls = []
+
+    def handshake():
+        calls.append(1)
+        if len(calls) == 1:
+            raise ValueError('bad handshake')
+        return [EvoEncoder.encode_hex(b'0801')]
+
+    link = supervise(handshake)
+    assert link.state == LinkState.connected
+    assert link.failures == 1
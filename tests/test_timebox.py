@@ -0,0 +1,64 @@
+import time
+import asyncio
+
+from evo.encoder import EvoEncoder
+from evo.simulator import Simulator
+from evo.timebox import AsyncTimebox
+
+
+def connect(loop, simulator):
+    server = loop.run_until_complete(simulator.start('tcp://127.0.0.1:0'))
+    port = server.sockets[0].getsockname()[1]
+    timebox = AsyncTimebox('tcp://127.0.0.1:{}'.format(port), loop, timeout=0.2)
+    timebox.connect()
+    return timebox
+
+
+def close(loop, simulator, timebox):
+    timebox.disconnect()
+    simulator.close()
+    loop.run_until_complete(asyncio.sleep(0.01))
+
+
+def test_reply_resolves_submitted_command(loop):
+    simulator = Simulator()
+    timebox = connect(loop, simulator)
+    colours = [0xFF0000] * 128 + [0x0000FF] * 128
+
+    async def scenario():
+        acks = [await timebox.submit(EvoEncoder.image_bytes(colours)) for _ in range(3)]
+        return await asyncio.gather(*acks)
+
+    try:
+        replies = loop.run_until_complete(scenario())
+    finally:
+        close(loop, simulator, timebox)
+
+    assert replies == [bytes((0x04, 0x44, 0x55))] * 3
+    assert simulator.image == [(255, 0, 0)] * 128 + [(0, 0, 255)] * 128
+    assert timebox.stats()['inflight'] == 0
+    assert timebox.stats()['write']['count'] == 3
+    assert timebox.timeouts == 0
+
+
+def test_missing_reply_times_out_from_write(loop):
+    simulator = Simulator(drop=1.0)
+    timebox = connect(loop, simulator)
+
+    async def scenario():
+        ack = await timebox.submit(EvoEncoder.image_bytes([0] * 256), timeout=0.05)
+        entry = timebox._pending[0]
+        assert entry.written is None
+        time.sleep(0.1)
+        reply = await ack
+        return reply, entry.written, time.monotonic()
+
+    try:
+        reply, written, expired = loop.run_until_complete(scenario())
+    finally:
+        close(loop, simulator, timebox)
+
+    assert reply is None
+    assert expired - written >= 0.05
+    assert timebox.timeouts == 1
+    assert timebox.stats()['inflight'] == 0
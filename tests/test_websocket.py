@@ -0,0 +1,57 @@
+import json
+
+from pixmap.histpixmap import ModeType
+from pixmap.rawpixmap import RawPixmap
+from bench import fixtures
+
+
+class FakeRequest():
+    remote_ip = '127.0.0.1'
+
+
+class FakeHandler(fixtures.FakeClient):
+    """Enough of a WsHandler for WsHandler.open"""
+
+    def __init__(self, divoom):
+        super().__init__()
+        self._divoom = divoom
+        self.request = FakeRequest()
+        self.messages = []
+
+    def set_nodelay(self, value: bool):
+        pass
+
+    def write_message(self, message: str):
+        super().write_message(message)
+        self.messages.append(json.loads(message))
+
+
+def open_client(server, divoom) -> FakeHandler:
+    client = FakeHandler(divoom)
+    server.WsHandler.open(client)
+    server.WsHandler.clients.discard(client)
+    return client
+
+
+def test_client_connecting_later_gets_current_frame(server, divoom):
+    assert server.WsHandler.count() == 0
+    pixmap = divoom._hist_pix
+    pixmap.set_sunset(1570208400)
+    pixmap.draw_mode(ModeType.sunset)
+
+    message = open_client(server, divoom).messages[0]
+    assert message['type'] == 'pixmap'
+    assert [tuple(p) for p in message['pixmap']] == pixmap.get_rgb_pixels()
+
+
+def test_connected_clients_get_delta(server, divoom):
+    pixmap = divoom._hist_pix
+    pixmap.draw_mode(ModeType.hist)
+    client = FakeHandler(divoom)
+    server.WsHandler.clients.add(client)
+    try:
+        pixmap.fill(RawPixmap.RED, 0, 0, 2, 1)
+        divoom.send()
+    finally:
+        server.WsHandler.clients.discard(client)
+    assert client.messages == [{'type': 'delta', 'delta': [[0, 0, [255, 0, 0]], [1, 0, [255, 0, 0]]]}]